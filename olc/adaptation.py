@@ -0,0 +1,77 @@
+"""
+Measurement of how fast the controller adapts to a change of task.
+
+A schedule of (step, task name) pairs says when the environment is replaced.
+After every change, the monitor records how many steps and seconds it takes
+until the reward average returns to its value right before the change (within
+a relative tolerance) and until the confidence returns to its value right
+before the change, as well as the first alarm of every change detector given
+to `update`. Recovery is only counted after the change had a visible effect:
+a drop of the reward average below the tolerance, or of the confidence below
+its value before the change. Changes without an effect are reported as not
+recovered, with the drop flags unset.
+"""
+
+import json
+import time
+
+
+class SwapMonitor:
+
+	def __init__(self, schedule, tolerance):
+		self.schedule = sorted([int(step), name] for step, name in schedule)
+		self.tolerance = tolerance
+		self.pending = []
+		self.finished = []
+
+	def due(self, step):
+		if self.schedule and step >= self.schedule[0][0]:
+			return self.schedule.pop(0)[1]
+		return None
+
+	def report(self):
+		return self.finished + [dict(s, recovered=False) for s in self.pending]
+
+	def save(self, path):
+		with open(path, 'w') as reportFile:
+			json.dump(self.report(), reportFile, indent='\t')
+
+	def start(self, step, task, meanReward, confidence):
+		self.pending.append({
+			'task': task,
+			'step': int(step),
+			'time': time.time(),
+			'baseline': float(meanReward),
+			'confidence-baseline': float(confidence),
+			'confidence-dropped': False,
+			'reward-dropped': False,
+			'reward-steps': None,
+			'reward-seconds': None,
+			'confidence-steps': None,
+			'confidence-seconds': None,
+			'detection-steps': {}
+		})
+
+	def update(self, step, meanReward, confidence, alarms=None):
+		finished = []
+		now = time.time()
+		for swap in self.pending:
+			for name, alarm in (alarms or {}).items():
+				if alarm and name not in swap['detection-steps']:
+					swap['detection-steps'][name] = int(step) - swap['step']
+			if meanReward < swap['baseline'] - self.tolerance * abs(swap['baseline']):
+				swap['reward-dropped'] = True
+			elif swap['reward-dropped'] and swap['reward-steps'] is None:
+				swap['reward-steps'] = int(step) - swap['step']
+				swap['reward-seconds'] = now - swap['time']
+			if confidence < swap['confidence-baseline']:
+				swap['confidence-dropped'] = True
+			elif swap['confidence-dropped'] and swap['confidence-steps'] is None:
+				swap['confidence-steps'] = int(step) - swap['step']
+				swap['confidence-seconds'] = now - swap['time']
+			if swap['reward-steps'] is not None and swap['confidence-steps'] is not None:
+				finished.append(swap)
+		for swap in finished:
+			self.pending.remove(swap)
+			self.finished.append(dict(swap, recovered=True))
+		return finished
@@ -0,0 +1,133 @@
+"""
+Search for the training cadence with the highest throughput on this machine.
+
+An epoch of the controller collects `nb-rollouts` transitions and then runs
+`nb-train` updates on batches of `batch-size` transitions. For every batch
+size, a controller is built for the real task and its replay buffer is filled
+with `warmup` transitions; then, for every number of rollouts, `epochs`
+epochs alternating the rollout steps and `Controller._train` (with the target
+updates) are timed, with `nb-train` set by the update-to-data ratio (updates
+per collected transition, every robot of a step collecting one). Numbers of
+rollouts for which the rounded `nb-train` misses the ratio by more than
+`ratio-tolerance` (relative) are skipped. The best combination is the one
+that processes the most samples per second, counting every sample of every
+training batch.
+
+Rollouts follow the controller (policy, noise, environment step, storage and
+step counter) without its metrics and logs, so their cost is a lower bound.
+The replay buffer holds `buffer-size` transitions, to keep memory low.
+"""
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from olc.controller import Controller
+
+
+def autotune(settings, environment, ratio=None):
+	"""
+	Time combinations of batch size and rollouts per epoch.
+
+	Parameters
+	----------
+	settings : dict
+		Complete settings object, including the `autotune` settings.
+	environment
+		Environment of the task.
+	ratio : float, optional
+		Updates per collected transition. By default, the ratio of the settings,
+		`nb-train` updates for `nb-rollouts` steps of every robot.
+
+	Returns
+	-------
+	results : list of dict
+		`batch-size`, `nb-rollouts`, `nb-train`, epoch time (`time`, s),
+		`transitions` and `samples` processed per second of every combination,
+		from the best to the worst.
+
+	Raises
+	------
+	ValueError
+		If no number of rollouts can realize the ratio.
+	"""
+	specs = settings['autotune']
+	results = []
+	for batchSize in specs['batch-size']:
+		trial = dict(settings, **{
+			'batch-size': batchSize,
+			'graph-cache': None,
+			'replay-buffer-max': max(specs['buffer-size'], batchSize),
+			'replay-buffer-min': max(specs['buffer-size'], batchSize)
+		})
+		tf.reset_default_graph()
+		controller = Controller(trial, environment, _NullLogger(), None)
+		controller._initialize()
+		if ratio is None:
+			ratio = settings['nb-train'] / (settings['nb-rollouts'] * controller.nbRobots)
+		rollout = _rollouts(controller)
+		rollout(max(specs['warmup'], batchSize))
+		for nbRollouts in specs['nb-rollouts']:
+			transitions = nbRollouts * controller.nbRobots
+			nbTrain = int(round(ratio * transitions))
+			if nbTrain == 0 or abs(nbTrain / transitions - ratio) > specs['ratio-tolerance'] * ratio:
+				continue
+			startTime = time.perf_counter()
+			for _ in range(specs['epochs']):
+				rollout(nbRollouts)
+				for _ in range(nbTrain):
+					controller._train()
+					controller.session.run([controller.actorTarget.update, controller.criticTarget.update])
+			elapsed = (time.perf_counter() - startTime) / specs['epochs']
+			results.append({
+				'batch-size': batchSize,
+				'nb-rollouts': nbRollouts,
+				'nb-train': nbTrain,
+				'time': elapsed,
+				'transitions': transitions / elapsed,
+				'samples': nbTrain * batchSize / elapsed
+			})
+		controller.session.close()
+	if not results:
+		raise ValueError('No number of rollouts gives {:.3g} updates per transition'.format(ratio))
+	return sorted(results, key=lambda x: -x['samples'])
+
+
+def _rollouts(controller):
+	# Steps of the training loop, keeping the episode between calls
+	state = None
+	done = True
+
+	def rollout(n):
+		nonlocal state, done
+		for _ in range(n):
+			if np.any(done):
+				state = controller.env.reset()
+				controller.noise.reset()
+			action = 0.5 * controller._learnedPolicy(state) + 0.5 * controller._randomPolicy(state)
+			newState, reward, done, _ = controller.env.step(action)
+			if controller.nbRobots > 1:
+				controller.buffer.storeTransitions(state, action, reward, newState, done)
+			else:
+				controller.buffer.storeTransition(state, action, reward, newState, done)
+			controller.session.run(controller.incrementStep)
+			state = newState
+	return rollout
+
+
+class _NullLogger:
+
+	logDir = None
+
+	def checkpoint(self, session, step):
+		pass
+
+	def logGraph(self):
+		pass
+
+	def logScalar(self, name, value, step):
+		pass
+
+	def writeSummary(self, summary, step):
+		pass
@@ -0,0 +1,79 @@
+"""
+Detection of changes in several signals at once.
+
+Every signal is normalized with exponential moving estimates of its mean and
+variance, and a two-sided change statistic is kept for each one. All signals
+are updated together with a few vector operations, so the cost of a step does
+not depend on the history.
+
+Methods
+-------
+cusum
+	Two-sided CUSUM with drift `k`: the positive statistic accumulates
+	`z - k` and the negative one `-z - k`, both clipped at zero.
+page-hinkley
+	Page-Hinkley test: the cumulative sums of `z - k` and `-z - k` are
+	compared with their running minimums.
+
+In both cases the statistics are multiplied by `decay` every step, as the
+reward CUSUM of the controller does, and a change is signalled while any of
+them is above `threshold`.
+"""
+
+import numpy as np
+
+
+class ChangeDetector:
+
+	def __init__(self, n, method, decay, drift, threshold, warmup):
+		if method not in ('cusum', 'page-hinkley'):
+			raise ValueError('Unknown change detection method "{}"'.format(method))
+		self.method = method
+		self.decay = decay
+		self.drift = drift
+		self.threshold = threshold
+		self.warmup = warmup
+		self.steps = 0
+		self.mean = np.zeros(n)
+		self.var = np.ones(n)
+		self.pos = np.zeros(n)
+		self.neg = np.zeros(n)
+		self.posMin = np.zeros(n)
+		self.negMin = np.zeros(n)
+		self.z = np.zeros(n)
+
+	def reset(self):
+		self.pos[:] = 0
+		self.neg[:] = 0
+		self.posMin[:] = 0
+		self.negMin[:] = 0
+
+	def statistics(self):
+		if self.method == 'cusum':
+			return np.maximum(self.pos, self.neg)
+		return np.maximum(self.pos - self.posMin, self.neg - self.negMin)
+
+	def update(self, x):
+		self.steps += 1
+		# Normalize with the estimates before this sample
+		np.subtract(x, self.mean, out=self.z)
+		self.mean += (1 - self.decay) * self.z
+		squared = self.z ** 2
+		self.z /= np.sqrt(self.var + 1e-8)
+		self.var *= self.decay
+		self.var += (1 - self.decay) * squared
+		if self.steps <= self.warmup:
+			return False
+		self.pos += self.z - self.drift
+		self.neg -= self.z + self.drift
+		if self.method == 'cusum':
+			np.maximum(self.pos, 0, out=self.pos)
+			np.maximum(self.neg, 0, out=self.neg)
+		else:
+			np.minimum(self.posMin, self.pos, out=self.posMin)
+			np.minimum(self.negMin, self.neg, out=self.negMin)
+		self.pos *= self.decay
+		self.neg *= self.decay
+		self.posMin *= self.decay
+		self.negMin *= self.decay
+		return bool(np.any(self.statistics() > self.threshold))
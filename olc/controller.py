@@ -1,24 +1,62 @@
+import os
 import sys
 import time
+import types
 
 import numpy as np
 import tensorflow as tf
 
+import olc.environments as envs
+import olc.graph_cache as graphCache
+import olc.library as library
+import olc.noise as noise
+from olc.adaptation import SwapMonitor
+from olc.change_detection import ChangeDetector
+from olc.environments.pipeline import Pipeline
+from olc.environments.rendering import Renderer
+from olc.memory import fitBuffer, variableBytes
 from olc.neural_network import Actor, Critic
-from olc.noise import OrnsteinUhlenbeck
+from olc.recording import Prefetcher, Recorder, load
 from olc.replay_buffer import ReplayBuffer
+from olc.settings import getValue, setValue
+
+# Settings that can be changed while the controller is running
+HYPERPARAMETERS = [
+	'tau',
+	'confidence-step',
+	'cusum-threshold',
+	'actor/learning-rate',
+	'critic/learning-rate',
+	'critic/lambda',
+	'noise/sigma'
+]
 
 
 class Controller:
 
-	def __init__(self, settings, environment, logger, checkpoint):
+	def __init__(self, settings, environment, logger, checkpoint, population=None):
 		self.settings = settings
 		self.env = environment
 		self.logger = logger
+		self.population = population
 		self.actionDim = self.env.action_space.low.size
 		self.stateDim = self.env.observation_space.low.size
-		self._setupModel()
-		self._setupMetrics()
+		self.actionRepeat = settings['task'].get('action-repeat', 1)
+		self.nbRobots = getattr(self.env, 'nbRobots', 1)
+		self.startTime = time.time()
+		self.cachedGraph = False
+		cachePath = None
+		if self.settings['graph-cache'] is not None:
+			key = graphCache.cacheKey(settings, self.stateDim, self.env.action_space.high, self.env.action_space.low)
+			cachePath = os.path.join(self.settings['graph-cache'], key)
+		if cachePath is not None and graphCache.exists(cachePath):
+			self._loadGraph(cachePath)
+		else:
+			self._setupHyperparameters()
+			self._setupModel()
+			self._setupMetrics()
+			if cachePath is not None:
+				self._saveGraph(cachePath)
 		self.logger.logGraph()
 		if checkpoint is not None:
 			self.checkpoint = tf.train.latest_checkpoint(checkpoint)
@@ -26,96 +64,391 @@ class Controller:
 			self.checkpoint = None
 
 	def run(self):
-		self.session = tf.Session()
-		self.session.run(tf.global_variables_initializer())
-		# Initialize actor target parameters
-		actorParams = self.session.run(self.actor.parameters)
-		for f, t in zip(actorParams, self.actorTarget.parameters):
-			t.load(f, self.session)
-		# Initialize critic target parameters
-		criticParams = self.session.run(self.critic.parameters)
-		for f, t in zip(criticParams, self.criticTarget.parameters):
-			t.load(f, self.session)
-		# Create noise process
-		self.noise = OrnsteinUhlenbeck(self.actionDim,
-			self.settings['noise']['dt'],
-			self.settings['noise']['theta'],
-			self.settings['noise']['sigma']
-		)
-		# Load checkpoint if provided
-		if self.checkpoint is not None:
-			self.logger.loadCheckpoint(self.session, self.checkpoint)
-			self.buffer.restore(self.session)
+		self._initialize()
+		# Goal relabeling, set before anything is stored
+		goalEnv = None
+		if self.settings['hindsight-ratio'] > 0:
+			goalEnv = self._goalEnvironment()
+			self.buffer.setRelabeling(goalEnv.relabel, goalEnv.goalDim, self.settings['hindsight-ratio'])
+		# Warm start the buffer if not resuming
+		if self.checkpoint is None and self.settings['warm-start']:
+			n = load(self.settings['warm-start'], self.buffer)
+			print('Loaded {} transitions into the replay buffer.'.format(n))
+		# Record transitions if requested
+		recorder = None
+		if self.settings['record']['directory'] is not None:
+			recorder = Recorder(self.settings['record']['directory'], self.env.observation_space, self.env.action_space, self.settings['record']['chunk-size'])
 		# Training
 		epoch = 0
 		step = 0
+		savedStep = 0
 		done = True
 		confidence = 0
+		meanReward = 0
+		self.detector = None
+		swaps = SwapMonitor(self.settings['task-schedule'], self.settings['recovery-tolerance'])
+		pipeline = Pipeline(self.env, self.settings['pipeline'])
+		taskName = self.settings['task']['name']
+		renderer = self._renderer(taskName)
+		previous = None
+
+		def record(state, action, reward, newState, done, info, achieved):
+			nonlocal step, confidence, meanReward
+			# Environments with several robots give one row per robot
+			if self.nbRobots > 1:
+				self.buffer.storeTransitions(state, action, reward, newState, done, achieved)
+				if recorder is not None:
+					for transition in zip(state, action, reward, newState, done):
+						recorder.store(*transition)
+				initial, states, actions = state, newState, action
+			else:
+				self.buffer.storeTransition(state, action, reward, newState, done, achieved)
+				if recorder is not None:
+					recorder.store(state, action, reward, newState, done)
+				initial, states, actions = [state], [newState], [action]
+			physicsSteps = info['physics-steps'] if isinstance(info, dict) and 'physics-steps' in info else 1
+			# Q(s, a) of the stored transitions, and the action value and target value of the new states
+			n = len(states)
+			step, values, targetValues = self.session.run([self.incrementStep, self.critic.output, self.criticTarget.output], {
+				self.physicsSteps: physicsSteps * self.nbRobots,
+				self.action: np.concatenate((actions, actions)),
+				self.state: np.concatenate((initial, states)),
+				self.isTraining: False
+			})
+			rewards = np.reshape(reward, n)
+			terminal = np.reshape(done, n)
+			tdErrors = rewards + self.settings['gamma'] * targetValues[n:, 0] * (1 - terminal) - values[:n, 0]
+			actionValue = values[n:].mean()
+			reward = rewards.mean()
+			detected = self._detectChange(np.asarray(states), rewards, tdErrors)
+			_, confidence, meanReward, rewardChange, metricSums = self.session.run(
+				[self.updateMetrics, self.confidence, self.meanReward, self.rewardChange, self.metrics],
+				{self.actionValue: actionValue, self.reward: reward, self.changeDetected: detected})
+			for swap in swaps.update(step, meanReward, confidence, {'reward-cusum': rewardChange, 'detector': detected}):
+				self.logger.logScalar('Recovery/Reward steps', swap['reward-steps'], swap['step'])
+				self.logger.logScalar('Recovery/Confidence steps', swap['confidence-steps'], swap['step'])
+				for name, detection in swap['detection-steps'].items():
+					self.logger.logScalar('Recovery/Detection steps/' + name, detection, swap['step'])
+				print('Recovered from {} after {} steps ({:.1f}s), confidence after {} steps ({:.1f}s)'.format(
+					swap['task'], swap['reward-steps'], swap['reward-seconds'], swap['confidence-steps'], swap['confidence-seconds']))
+			[self.logger.logScalar('Action/' + str(i), x, step) for i, x in enumerate(actions[0])]
+			if isinstance(info, dict) and 'error' in info:
+				self.logger.logScalar('Error', info['error'], step)
+			self.logger.writeSummary(metricSums, step)
+
 		self.buffer.save(self.session)
 		self.logger.checkpoint(self.session, 0)
-		self.test(step)
+		score = self.test(step)
 		while step < self.settings['steps']:
 			startTime = time.time()
 			epoch += 1
 			for _ in range(self.settings['nb-rollouts']):
-				if done:
+				task = swaps.due(step)
+				if task is not None:
+					self.swapEnvironment(task)
+					taskName = task
+					pipeline.close()
+					pipeline = Pipeline(self.env, self.settings['pipeline'])
+					if renderer is not None:
+						renderer.close()
+						renderer = self._renderer(task)
+					if goalEnv is not None:
+						goalEnv = self._goalEnvironment()
+						self.buffer.relabel = goalEnv.relabel
+					swaps.start(step, task, meanReward, confidence)
+					print('Step {}: switched to {}'.format(step, task))
+					done = True
+				if np.any(done):
+					# The last transition belongs to the episode that ends
+					if previous is not None:
+						record(*previous)
+						previous = None
+					self.buffer.endEpisode()
 					state = self.env.reset()
 					self.noise.reset()
 					done = False
+					achieved = goalEnv.achievedGoal() if goalEnv is not None else None
 				action = 0.5 * (1. + confidence) * self._learnedPolicy(state) + 0.5 * (1. - confidence) * self._randomPolicy(state)
-				newState, reward, done, info = self.env.step(action)
+				pipeline.send(action)
+				# With a pipeline, the previous transition is handled while the simulation steps
+				if previous is not None:
+					record(*previous)
+				newState, reward, done, info = pipeline.receive()
+				if self.startTime is not None:
+					elapsed = time.time() - self.startTime
+					self.logger.logScalar('Time to first step', elapsed, 0)
+					print('Time to first step: {:.2f}s ({} graph)'.format(elapsed, 'cached' if self.cachedGraph else 'new'))
+					self.startTime = None
 				if self.settings['controller-type'] == 'continuous':
-					done = False
-				self.buffer.storeTransition(state, action, reward, newState, done)
+					done = np.zeros_like(done)
+				if goalEnv is not None:
+					newAchieved = goalEnv.achievedGoal()
+					previous = (state, action, reward, newState, done, info, (achieved, newAchieved))
+					achieved = newAchieved
+				else:
+					previous = (state, action, reward, newState, done, info, None)
 				state = newState
-				step, actionValue = self.session.run([self.incrementStep, self.critic.output],
-					{self.action: [action], self.state: [state], self.isTraining: False})
-				_, confidence, metricSums = self.session.run([self.updateMetrics, self.confidence, self.metrics],
-					{self.actionValue: actionValue.item(), self.reward: reward})
-				[self.logger.logScalar('Action/' + str(i), x, step) for i, x in enumerate(action)]
-				if isinstance(info, dict) and 'error' in info:
-					self.logger.logScalar('Error', info['error'], step)
-				self.logger.writeSummary(metricSums, step)
-				if self.settings['render']:
-					self.env.render()
+				if not pipeline.threaded:
+					record(*previous)
+					previous = None
+				if renderer is not None:
+					renderer.update()
+			if previous is not None:
+				record(*previous)
+				previous = None
+			self.logger.logScalar('Step time', (time.time() - startTime) / self.settings['nb-rollouts'], step)
 			loss = 0
-			self.buffer.setCapacity(self.settings['replay-buffer-min'] + confidence * (self.settings['replay-buffer-max'] - self.settings['replay-buffer-min']))
+			window = self.settings['replay-buffer-min'] + confidence * (self.settings['replay-buffer-max'] - self.settings['replay-buffer-min'])
+			if self.settings['replay-sampling'] == 'recency':
+				# Older transitions are kept, only sampled less often
+				self.buffer.setRecency(window)
+				self.logger.logScalar('Replay recency', window, step)
+			else:
+				self.buffer.setCapacity(window)
 			for _ in range(self.settings['nb-train']):
 				loss += self._train()
 				self.session.run([self.actorTarget.update, self.criticTarget.update])
 			loss /= self.settings['nb-train']
 			self.logger.logScalar('Critic loss', loss, step)
-			if step % self.settings['save-interval'] == 0:
+			if step // self.settings['save-interval'] > savedStep // self.settings['save-interval']:
+				savedStep = step
 				self.buffer.save(self.session)
 				self.logger.checkpoint(self.session, step)
-				self.test(step)
+				if recorder is not None:
+					recorder.flush()
+				score = self.test(step)
+				if self.population is not None:
+					self.population.exploit(self, step, score)
 			elapsed = time.time() - startTime
 			print("Epoch {}:\tSteps: {}\tTime: {:.3}s".format(epoch, step, elapsed))
+		pipeline.close()
+		if renderer is not None:
+			renderer.close()
+		if recorder is not None:
+			recorder.close()
+		if self.settings['task-schedule']:
+			swaps.save(os.path.join(self.logger.logDir, 'recovery.json'))
+		# The last checkpoint joins the policy library
+		specs = self.settings['library']
+		if specs['directory'] is not None and specs['add']:
+			checkpoint = tf.train.latest_checkpoint(os.path.dirname(self.logger.savePath))
+			settings = dict(self.settings, task=dict(self.settings['task'], name=taskName))
+			library.add(specs['directory'], checkpoint, settings, self.stateDim, self.actionDim, score)
+
+	def swapEnvironment(self, task):
+		environment = envs.make(dict(self.settings['task'], name=task))
+		if environment.action_space.low.size != self.actionDim or environment.observation_space.low.size != self.stateDim:
+			environment.close()
+			raise ValueError('Task "{}" has different state or action dimensions'.format(task))
+		self.env.close()
+		self.env = environment
+
+	def trainOffline(self, directories):
+		self._initialize()
+		prefetcher = Prefetcher(directories, self.stateDim, self.actionDim,
+			self.settings['offline']['block-size'], self.settings['offline']['prefetch'], self.settings['offline']['epochs'])
+		# Same number of updates per transition as in on-line training
+		ratio = self.settings['nb-train'] / self.settings['nb-rollouts']
+		updates = 0
+		pending = 0.
+		lastSave = 0
+		startTime = time.time()
+		reportTime = startTime
+		reportUpdates = 0
+		for block in prefetcher:
+			self.buffer.storeTransitions(*block)
+			pending += ratio * len(block[0])
+			loss = 0
+			n = 0
+			while pending >= 1:
+				loss += self._train()
+				self.session.run([self.actorTarget.update, self.criticTarget.update])
+				pending -= 1
+				n += 1
+			updates += n
+			if n > 0:
+				self.logger.logScalar('Critic loss', loss / n, updates)
+			now = time.time()
+			if now - reportTime >= self.settings['offline']['report-interval']:
+				rate = (updates - reportUpdates) / (now - reportTime)
+				self.logger.logScalar('Updates per second', rate, updates)
+				print("Updates: {}\tUpdates/s: {:.1f}\tPrefetched: {}".format(updates, rate, prefetcher.queue.qsize()))
+				reportTime = now
+				reportUpdates = updates
+			if updates - lastSave >= self.settings['save-interval']:
+				self.buffer.save(self.session)
+				self.logger.checkpoint(self.session, updates)
+				lastSave = updates
+		self.buffer.save(self.session)
+		self.logger.checkpoint(self.session, updates)
+		elapsed = time.time() - startTime
+		print("Updates: {}\tTime: {:.1f}s\tUpdates/s: {:.1f}".format(updates, elapsed, updates / elapsed))
+
+	def memoryUsage(self):
+		variables = tf.global_variables()
+		optimizer = [v for v in variables if '/Adam' in v.op.name or v.op.name.startswith(('train_actor/', 'train_critic/'))]
+		networks = [v for v in variables if v.op.name.split('/')[0] in ('actor', 'critic', 'actor_target', 'critic_target') and '/Adam' not in v.op.name]
+		bufferBytes = self.buffer.nbytes()
+		usage = {
+			'replay-buffer': bufferBytes['numpy'],
+			'replay-buffer-mirror': bufferBytes['tensorflow'],
+			'networks': variableBytes(networks),
+			'optimizer': variableBytes(optimizer)
+		}
+		usage['total'] = sum(usage.values())
+		return usage
 
 	def test(self, step):
 		cumReward = 0
 		for episode in range(5):
 			done = False
 			state = self.env.reset()
-			while not done:
+			while not np.all(done):
 				action = self._learnedPolicy(state)
 				state, reward, done, _ = self.env.step(action)
-				cumReward += reward
+				cumReward += np.mean(reward)
 		self.logger.logScalar('Learning curve', cumReward / 5, step)
+		return cumReward / 5
+
+	def getHyperparameters(self):
+		return {name: getValue(self.settings, name) for name in HYPERPARAMETERS}
+
+	def setHyperparameters(self, values):
+		for name, value in values.items():
+			setValue(self.settings, name, value)
+			if name in self.hyperparameters:
+				self.hyperparameters[name].load(value, self.session)
+		if hasattr(self.noise, 'sigma'):
+			self.noise.sigma = self.settings['noise']['sigma']
+
+	def _detectChange(self, states, rewards, tdErrors):
+		specs = self.settings['change-detector']
+		if specs['name'] == 'reward-cusum':
+			return False
+		# Reward components of Roboschool environments, if available, for every robot
+		environment = getattr(self.env, 'unwrapped', self.env)
+		components = [getattr(robot, 'rewards', []) for robot in getattr(environment, 'robots', [environment])]
+		signals = np.concatenate([rewards, tdErrors, np.ravel(components), states.ravel()])
+		if self.detector is None or self.detector.mean.size != signals.size:
+			self.detector = ChangeDetector(signals.size, specs['name'], self.settings['metric-decay'] ** self.actionRepeat,
+				specs['drift'], specs['threshold'], specs['warmup'])
+		return self.detector.update(signals)
+
+	def _goalEnvironment(self):
+		environment = getattr(self.env, 'unwrapped', self.env)
+		if not hasattr(environment, 'relabel'):
+			raise ValueError('Task "{}" does not support goal relabeling'.format(self.settings['task']['name']))
+		# Rewards summed over repeated steps only relabel correctly when they telescope
+		if self.actionRepeat > 1 and not getattr(environment, 'relabelsRepeatedSteps', True):
+			raise ValueError('Task "{}" does not support goal relabeling with action repeat'.format(self.settings['task']['name']))
+		return environment
+
+	def _initialize(self):
+		usage = self.memoryUsage()
+		print('Memory (MiB):\t' + '\t'.join('{}: {:.1f}'.format(k, v / 2 ** 20) for k, v in usage.items()))
+		self.session = tf.Session()
+		self.session.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+		# A cached graph may have been built with other hyperparameter values
+		for name, variable in self.hyperparameters.items():
+			variable.load(getValue(self.settings, name), self.session)
+		# Start new runs from the closest policy of the library
+		if self.checkpoint is None and self.settings['library']['directory'] is not None and self.settings['library']['initialize']:
+			self._initializeFromLibrary(self.settings['library']['directory'])
+		# Initialize actor target parameters
+		actorParams = self.session.run(self.actor.parameters)
+		for f, t in zip(actorParams, self.actorTarget.parameters):
+			t.load(f, self.session)
+		# Initialize critic target parameters
+		criticParams = self.session.run(self.critic.parameters)
+		for f, t in zip(criticParams, self.criticTarget.parameters):
+			t.load(f, self.session)
+		# Create noise process
+		self.noise = noise.make(self.settings['noise'], self.actionDim, n=self.nbRobots if self.nbRobots > 1 else None)
+		# Load checkpoint if provided
+		if self.checkpoint is not None:
+			self.logger.loadCheckpoint(self.session, self.checkpoint)
+			self.buffer.restore(self.session)
+
+	def _initializeFromLibrary(self, directory):
+		variables = {v.op.name: v for v in tf.global_variables() if library.isNetwork(v.op.name)}
+		shapes = {name: v.shape.as_list() for name, v in variables.items()}
+		entry = library.closest(directory, self.settings['task']['name'], self.stateDim, self.actionDim, shapes,
+			library.networkKey(self.settings))
+		if entry is None:
+			print('No compatible policy in the library, starting from random parameters.')
+			return
+		values = library.load(directory, entry)
+		copied = [name for name in variables if name in values and list(values[name].shape) == shapes[name]]
+		for name in copied:
+			variables[name].load(values[name], self.session)
+		print('Initialized {} of {} network variables from the {} policy {}.'.format(len(copied), len(variables), entry['task'], entry['id']))
 
 	def _learnedPolicy(self, state):
+		# One row per robot in environments with several robots
 		action = self.session.run(self.actor.output, {
-			self.state: [state],
+			self.state: state if self.nbRobots > 1 else [state],
 			self.isTraining: False
 		})
-		return action[0]
+		return action if self.nbRobots > 1 else action[0]
+
+	def _loadGraph(self, path):
+		handles, extra = graphCache.load(path)
+		for name, value in handles.items():
+			if name != 'buffer':
+				setattr(self, name, value)
+		self.settings['replay-buffer-max'] = extra['capacity']
+		self.settings['replay-buffer-min'] = extra['min-capacity']
+		self.buffer = ReplayBuffer(extra['capacity'], self.actionDim, self.stateDim, extra['dtype'], handles['buffer'])
+		self.cachedGraph = True
 
 	def _randomPolicy(self, _):
 		return self.noise.step() * (self.env.action_space.high - self.env.action_space.low)
 
+	def _renderer(self, task):
+		if not self.settings['render']:
+			return None
+		return Renderer(self.env, task, self.settings['render-fps'])
+
+	def _saveGraph(self, path):
+		namespace = types.SimpleNamespace
+		handles = {
+			'action': self.action,
+			'state': self.state,
+			'qLabels': self.qLabels,
+			'isTraining': self.isTraining,
+			'physicsSteps': self.physicsSteps,
+			'incrementStep': self.incrementStep,
+			'hyperparameters': self.hyperparameters,
+			'actor': namespace(output=self.actor.output, parameters=self.actor.parameters, train=self.actor.train),
+			'critic': namespace(output=self.critic.output, parameters=self.critic.parameters, loss=self.critic.loss,
+				train=self.critic.train, actionGrads=self.critic.actionGrads),
+			'actorTarget': namespace(output=self.actorTarget.output, parameters=self.actorTarget.parameters, update=self.actorTarget.update),
+			'criticTarget': namespace(output=self.criticTarget.output, parameters=self.criticTarget.parameters, update=self.criticTarget.update),
+			'buffer': namespace(cap=self.buffer.cap, h=self.buffer.h, sz=self.buffer.sz,
+				si=self.buffer.si, a=self.buffer.a, r=self.buffer.r, sf=self.buffer.sf, t=self.buffer.t),
+			'actionValue': self.actionValue,
+			'reward': self.reward,
+			'meanValue': self.meanValue,
+			'meanReward': self.meanReward,
+			'rewardCusum': self.rewardCusum,
+			'rewardChange': self.rewardChange,
+			'changeDetected': self.changeDetected,
+			'confidence': self.confidence,
+			'updateMetrics': self.updateMetrics,
+			'metrics': self.metrics
+		}
+		extra = {
+			'capacity': self.buffer.max_capacity,
+			'min-capacity': self.settings['replay-buffer-min'],
+			'dtype': self.buffer.iState.dtype.name
+		}
+		graphCache.save(path, handles, extra)
+
 	def _setupMetrics(self):
-		decay = self.settings['metric-decay']
-		confidenceStep = self.settings['confidence-step']
+		# Time constants are kept in environment steps when actions are repeated
+		decay = self.settings['metric-decay'] ** self.actionRepeat
+		confidenceStep = self.hyperparameters['confidence-step'] * self.actionRepeat
+		cusumThreshold = self.hyperparameters['cusum-threshold']
 		self.updateMetrics = []
 		with tf.variable_scope('metrics'):
 			ema = tf.train.ExponentialMovingAverage(decay=decay)
@@ -140,13 +473,31 @@ class Controller:
 			self.updateMetrics.append(self.rewardCusum)
 			tf.summary.scalar('Reward cusum', self.rewardCusum, collections=['metrics'])
 			# Confidence
+			self.rewardChange = tf.abs(self.rewardCusum) > cusumThreshold
+			self.changeDetected = tf.placeholder_with_default(False, (), 'change_detected')
+			if self.settings['change-detector']['name'] == 'reward-cusum':
+				direction = tf.sign(cusumThreshold - tf.abs(self.rewardCusum))
+			else:
+				direction = tf.where(self.changeDetected, -1., 1.)
 			rewardConfidence = tf.get_variable('reward_confidence', shape=(), dtype=tf.float32, initializer=tf.initializers.zeros)
-			self.updateMetrics.append(tf.assign(rewardConfidence, tf.clip_by_value(rewardConfidence + confidenceStep * tf.sign(self.settings["cusum-threshold"] - tf.abs(self.rewardCusum)), 0., 1.)))
+			self.updateMetrics.append(tf.assign(rewardConfidence, tf.clip_by_value(rewardConfidence + confidenceStep * direction, 0., 1.)))
 			self.confidence = rewardConfidence
 			tf.summary.scalar('Confidence', self.confidence, collections=['metrics'])
 			# Summary merging
 			self.metrics = tf.summary.merge_all('metrics')
 
+	def _setupHyperparameters(self):
+		# Kept out of checkpoints so they can be changed between runs and members
+		self.hyperparameters = {}
+		with tf.variable_scope('hyperparameters'):
+			for name in HYPERPARAMETERS:
+				if name.startswith('noise/'):
+					continue
+				self.hyperparameters[name] = tf.get_variable(name.replace('/', '_'), (), dtype=tf.float32,
+					initializer=tf.initializers.constant(getValue(self.settings, name)),
+					trainable=False, collections=[tf.GraphKeys.LOCAL_VARIABLES]
+				)
+
 	def _setupModel(self):
 		self.action = tf.placeholder(tf.float32, (None, self.actionDim), name='action')
 		self.state = tf.placeholder(tf.float32, (None, self.stateDim), name='state')
@@ -156,12 +507,23 @@ class Controller:
 		self.critic = Critic('critic', self.settings['critic'], self.action, self.state, self.isTraining)
 		self.actorTarget = Actor('actor_target', self.settings['actor'], self.state, self.isTraining, self.env.action_space.high, self.env.action_space.low)
 		self.criticTarget = Critic('critic_target', self.settings['critic'], self.actorTarget.output, self.state, self.isTraining)
-		self.critic.createTrainOps(self.action, self.qLabels)
-		self.actor.createTrainOps(self.critic.actionGrads, self.settings['batch-size'])
-		self.actorTarget.createUpdateOps(self.settings['tau'], self.actor.parameters)
-		self.criticTarget.createUpdateOps(self.settings['tau'], self.critic.parameters)
-		self.incrementStep = tf.assign_add(tf.train.get_or_create_global_step(), 1)
-		self.buffer = ReplayBuffer(self.settings['replay-buffer-max'], self.actionDim, self.stateDim)
+		self.critic.createTrainOps(self.action, self.qLabels,
+			self.hyperparameters['critic/learning-rate'], self.hyperparameters['critic/lambda'])
+		self.actor.createTrainOps(self.critic.actionGrads, self.settings['batch-size'], self.hyperparameters['actor/learning-rate'])
+		self.actorTarget.createUpdateOps(self.hyperparameters['tau'], self.actor.parameters)
+		self.criticTarget.createUpdateOps(self.hyperparameters['tau'], self.critic.parameters)
+		self.physicsSteps = tf.placeholder_with_default(tf.constant(1, tf.int64), (), 'physics_steps')
+		self.incrementStep = tf.assign_add(tf.train.get_or_create_global_step(), self.physicsSteps)
+		capacity = self.settings['replay-buffer-max']
+		dtype = self.settings['replay-buffer-dtype']
+		if self.settings['memory-budget'] is not None:
+			# Relabeling allocates the achieved goals later, with the buffer
+			goalDim = self._goalEnvironment().goalDim if self.settings['hindsight-ratio'] > 0 else 0
+			capacity, dtype = fitBuffer(int(self.settings['memory-budget'] * 2 ** 20), variableBytes(tf.global_variables()),
+				self.stateDim, self.actionDim, capacity, max(self.settings['replay-buffer-min'], self.settings['batch-size']), goalDim)
+			self.settings['replay-buffer-max'] = capacity
+			self.settings['replay-buffer-min'] = min(self.settings['replay-buffer-min'], capacity)
+		self.buffer = ReplayBuffer(capacity, self.actionDim, self.stateDim, dtype)
 
 	def _train(self):
 		siBatch, aBatch, rBatch, sfBatch, tBatch = self.buffer.sample(self.settings['batch-size'])
@@ -0,0 +1,213 @@
+"""
+Training of several independent agents in one graph.
+
+The actors and critics of the agents, and their targets, are stacked along a
+leading agent dimension, so a single `session.run` computes the actions of
+every agent and a single update trains all of them with batched matrix
+products. The agents share no parameters: each one only receives gradients
+from its own slice of the stacked variables, and Adam works element-wise.
+Every agent has its own environment, replay buffer, noise and confidence.
+"""
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import olc.noise as noise
+from olc.environments.rendering import Renderer
+from olc.neural_network import StackedActor, StackedCritic
+from olc.replay_buffer import ReplayBuffer
+
+
+class Ensemble:
+
+	def __init__(self, settings, environments, logger, checkpoint):
+		self.settings = settings
+		self.envs = environments
+		self.n = len(environments)
+		self.logger = logger
+		self.actionDim = self.envs[0].action_space.low.size
+		self.stateDim = self.envs[0].observation_space.low.size
+		self.actionRepeat = settings['task'].get('action-repeat', 1)
+		self._setupModel()
+		self._setupMetrics()
+		self.logger.logGraph()
+		if checkpoint is not None:
+			self.checkpoint = tf.train.latest_checkpoint(checkpoint)
+		else:
+			self.checkpoint = None
+
+	def run(self):
+		self._initialize()
+		epoch = 0
+		step = 0
+		savedStep = 0
+		done = np.ones(self.n, bool)
+		states = np.zeros((self.n, self.stateDim))
+		confidence = np.zeros(self.n)
+		renderer = None
+		if self.settings['render']:
+			renderer = Renderer(self.envs[0], self.settings['task']['name'], self.settings['render-fps'])
+		for buffer in self.buffers:
+			buffer.save(self.session)
+		self.logger.checkpoint(self.session, 0)
+		self.test(step)
+		while step < self.settings['steps']:
+			startTime = time.time()
+			epoch += 1
+			for _ in range(self.settings['nb-rollouts']):
+				if done.any():
+					for i in np.flatnonzero(done):
+						states[i] = self.envs[i].reset()
+					self.noise.reset(done)
+					done[:] = False
+				weight = confidence[:, np.newaxis]
+				actions = 0.5 * (1. + weight) * self._learnedPolicy(states) + 0.5 * (1. - weight) * self._randomPolicy()
+				rewards = np.zeros(self.n)
+				physicsSteps = 1
+				for i, env in enumerate(self.envs):
+					newState, rewards[i], done[i], info = env.step(actions[i])
+					if self.settings['controller-type'] == 'continuous':
+						done[i] = False
+					self.buffers[i].storeTransition(states[i], actions[i], rewards[i], newState, done[i])
+					states[i] = newState
+					if isinstance(info, dict) and 'physics-steps' in info:
+						physicsSteps = max(physicsSteps, info['physics-steps'])
+				step, _, confidence, metricSums = self.session.run(
+					[self.incrementStep, self.updateMetrics, self.confidence, self.metrics],
+					{self.physicsSteps: physicsSteps, self.reward: rewards})
+				self.logger.writeSummary(metricSums, step)
+				if renderer is not None:
+					renderer.update()
+			for buffer, c in zip(self.buffers, confidence):
+				window = self.settings['replay-buffer-min'] + c * (self.settings['replay-buffer-max'] - self.settings['replay-buffer-min'])
+				if self.settings['replay-sampling'] == 'recency':
+					buffer.setRecency(window)
+				else:
+					buffer.setCapacity(window)
+			loss = np.zeros(self.n)
+			for _ in range(self.settings['nb-train']):
+				loss += self._train()
+				self.session.run([self.actorTarget.update, self.criticTarget.update])
+			loss /= self.settings['nb-train']
+			self.logger.logScalar('Critic loss', loss.mean(), step)
+			if step // self.settings['save-interval'] > savedStep // self.settings['save-interval']:
+				savedStep = step
+				for buffer in self.buffers:
+					buffer.save(self.session)
+				self.logger.checkpoint(self.session, step)
+				self.test(step)
+			elapsed = time.time() - startTime
+			print("Epoch {}:\tSteps: {}\tTime: {:.3}s".format(epoch, step, elapsed))
+		if renderer is not None:
+			renderer.close()
+
+	def test(self, step):
+		cumRewards = np.zeros(self.n)
+		for episode in range(5):
+			states = np.stack([env.reset() for env in self.envs])
+			done = np.zeros(self.n, bool)
+			while not done.all():
+				actions = self._learnedPolicy(states)
+				for i in np.flatnonzero(~done):
+					states[i], reward, done[i], _ = self.envs[i].step(actions[i])
+					cumRewards[i] += reward
+		scores = cumRewards / 5
+		for i, score in enumerate(scores):
+			self.logger.logScalar('Learning curve/Agent {}'.format(i + 1), score, step)
+		self.logger.logScalar('Learning curve', scores.mean(), step)
+		return scores
+
+	def _initialize(self):
+		self.session = tf.Session()
+		self.session.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+		# Initialize target parameters
+		for network, target in [(self.actor, self.actorTarget), (self.critic, self.criticTarget)]:
+			params = self.session.run(network.parameters)
+			for f, t in zip(params, target.parameters):
+				t.load(f, self.session)
+		# One noise process per agent
+		self.noise = noise.make(self.settings['noise'], self.actionDim, n=self.n)
+		if self.checkpoint is not None:
+			self.logger.loadCheckpoint(self.session, self.checkpoint)
+			for buffer in self.buffers:
+				buffer.restore(self.session)
+
+	def _learnedPolicy(self, states):
+		actions = self.session.run(self.actor.output, {self.state: states[:, np.newaxis]})
+		return actions[:, 0]
+
+	def _randomPolicy(self):
+		return self.noise.step() * (self.envs[0].action_space.high - self.envs[0].action_space.low)
+
+	def _setupMetrics(self):
+		# Same reward CUSUM and confidence as the controller, one per agent
+		decay = self.settings['metric-decay'] ** self.actionRepeat
+		confidenceStep = self.settings['confidence-step'] * self.actionRepeat
+		cusumThreshold = self.settings['cusum-threshold']
+		self.updateMetrics = []
+		with tf.variable_scope('metrics'):
+			ema = tf.train.ExponentialMovingAverage(decay=decay)
+			self.reward = tf.placeholder(tf.float32, shape=(self.n,), name='reward')
+			self.updateMetrics.append(ema.apply([self.reward]))
+			self.meanReward = ema.average(self.reward)
+			tf.summary.scalar('Reward', tf.reduce_mean(self.reward), collections=['metrics'])
+			tf.summary.scalar('Reward average', tf.reduce_mean(self.meanReward), collections=['metrics'])
+			tf.summary.histogram('Reward average/Agents', self.meanReward, collections=['metrics'])
+			rewardCusumPos = tf.get_variable('reward_cusum_pos', shape=(self.n,), dtype=tf.float32, initializer=tf.initializers.zeros)
+			rewardCusumNeg = tf.get_variable('reward_cusum_neg', shape=(self.n,), dtype=tf.float32, initializer=tf.initializers.zeros)
+			self.updateMetrics.append(tf.assign(rewardCusumPos, decay * tf.maximum(0., rewardCusumPos + self.reward - self.meanReward)))
+			self.updateMetrics.append(tf.assign(rewardCusumNeg, decay * tf.minimum(0., rewardCusumNeg + self.reward - self.meanReward)))
+			self.rewardCusum = rewardCusumPos - rewardCusumNeg
+			direction = tf.sign(cusumThreshold - tf.abs(self.rewardCusum))
+			rewardConfidence = tf.get_variable('reward_confidence', shape=(self.n,), dtype=tf.float32, initializer=tf.initializers.zeros)
+			self.updateMetrics.append(tf.assign(rewardConfidence, tf.clip_by_value(rewardConfidence + confidenceStep * direction, 0., 1.)))
+			self.confidence = rewardConfidence
+			tf.summary.scalar('Confidence', tf.reduce_mean(self.confidence), collections=['metrics'])
+			self.metrics = tf.summary.merge_all('metrics')
+
+	def _setupModel(self):
+		high = self.envs[0].action_space.high
+		low = self.envs[0].action_space.low
+		self.action = tf.placeholder(tf.float32, (self.n, None, self.actionDim), name='action')
+		self.state = tf.placeholder(tf.float32, (self.n, None, self.stateDim), name='state')
+		self.qLabels = tf.placeholder(tf.float32, (self.n, None, 1), name='q_labels')
+		self.actor = StackedActor('actor', self.settings['actor'], self.n, self.state, high, low)
+		self.critic = StackedCritic('critic', self.settings['critic'], self.n, self.action, self.state)
+		self.actorTarget = StackedActor('actor_target', self.settings['actor'], self.n, self.state, high, low)
+		self.criticTarget = StackedCritic('critic_target', self.settings['critic'], self.n, self.actorTarget.output, self.state)
+		self.critic.createTrainOps(self.action, self.qLabels)
+		self.actor.createTrainOps(self.critic.actionGrads, self.settings['batch-size'])
+		self.actorTarget.createUpdateOps(self.settings['tau'], self.actor.parameters)
+		self.criticTarget.createUpdateOps(self.settings['tau'], self.critic.parameters)
+		self.physicsSteps = tf.placeholder_with_default(tf.constant(1, tf.int64), (), 'physics_steps')
+		self.incrementStep = tf.assign_add(tf.train.get_or_create_global_step(), self.physicsSteps)
+		self.buffers = []
+		for i in range(self.n):
+			with tf.variable_scope('agent_{}'.format(i + 1)):
+				self.buffers.append(ReplayBuffer(self.settings['replay-buffer-max'], self.actionDim, self.stateDim,
+					self.settings['replay-buffer-dtype']))
+
+	def _train(self):
+		batches = [buffer.sample(self.settings['batch-size']) for buffer in self.buffers]
+		if any(len(batch[2]) == 0 for batch in batches):
+			return np.zeros(self.n)
+		siBatch, aBatch, rBatch, sfBatch, tBatch = [np.stack(x) for x in zip(*batches)]
+		# Critic
+		qValues = self.session.run(self.criticTarget.output, {
+			self.state: sfBatch
+		})
+		labels = self.settings['gamma'] * qValues + rBatch[..., np.newaxis]
+		labels[tBatch] = 0
+		_, losses, actions = self.session.run([self.critic.train, self.critic.losses, self.actor.output], {
+			self.action: aBatch,
+			self.state: siBatch,
+			self.qLabels: labels
+		})
+		# Actor
+		self.session.run(self.actor.train, {
+			self.action: actions,
+			self.state: siBatch
+		})
+		return losses
@@ -1,10 +1,23 @@
 import argparse
 import datetime
 import json
+import os
+
+import tensorflow as tf
 
 import olc.environments as envs
+import olc.library as library
+from olc.autotune import autotune
 from olc.controller import Controller
+from olc.ensemble import Ensemble
+from olc.evaluation import evaluate
 from olc.logger import Logger
+from olc.population import train as trainPopulation
+from olc.profiling import profile
+from olc.quantization import compare, export, readActor, readStates, referenceActions
+from olc.recording import Spaces
+from olc.report import REPORT_TAGS, report
+from olc.serving import PolicyServer
 from olc.settings import getDefaults, merge
 
 
@@ -43,13 +56,530 @@ def olc_train():
 		experimentName = args.name
 	else:
 		experimentName = '{}-{:%H:%M}'.format(settings['task']['name'], time)
-	logger = Logger(experimentName)
-
-	# Create controller
 	defParams = getDefaults(__name__, 'params')
 	mergedParams = merge(defParams, settings)
+	logger = Logger(experimentName, settings=mergedParams['logging'])
+
+	# Create controller
 	controller = Controller(mergedParams, environment, logger, args.checkpoint)
 
 	# Run
 	controller.run()
 	environment.close()
+	logger.close()
+
+
+def olc_pbt():
+	parser = argparse.ArgumentParser(
+		description='Run an experiment with population based training.'
+	)
+	parser.add_argument(
+		'settings',
+		help='path to the settings file.'
+	)
+	parser.add_argument(
+		'-k', '--size',
+		type=int,
+		default=None,
+		required=False,
+		help='number of members in the population.'
+	)
+	parser.add_argument(
+		'-n', '--name',
+		default=None,
+		required=False,
+		help='name for the logs and checkpoints directories.'
+	)
+	args = parser.parse_args()
+
+	# Read settings
+	with open(args.settings, 'r') as settingsFile:
+		settings = json.load(settingsFile)
+	defParams = getDefaults(__name__, 'params')
+	mergedParams = merge(defParams, settings)
+	if args.size is not None:
+		mergedParams['population']['size'] = args.size
+
+	# Experiment name
+	time = datetime.datetime.now().time()
+	if args.name is not None:
+		experimentName = args.name
+	else:
+		experimentName = '{}-pbt-{:%H:%M}'.format(settings['task']['name'], time)
+
+	# Run
+	table = trainPopulation(mergedParams, experimentName)
+	for index, result in sorted(table.items(), key=lambda x: -x[1]['score']):
+		print('Member {}:\tScore: {:.4}\tStep: {}'.format(index, result['score'], result['step']))
+		for name, value in sorted(result['hyperparameters'].items()):
+			print('\t{}: {:.4}'.format(name, value))
+
+
+def olc_serve():
+	parser = argparse.ArgumentParser(
+		description='Serve the actions of a trained policy over a local socket.'
+	)
+	parser.add_argument(
+		'settings',
+		help='path to the settings file used for training.'
+	)
+	parser.add_argument(
+		'checkpoint',
+		help='path to the checkpoint file or directory to load.'
+	)
+	parser.add_argument(
+		'-s', '--socket',
+		default='/tmp/olc.sock',
+		required=False,
+		help='path of the Unix socket to listen on.'
+	)
+	parser.add_argument(
+		'-p', '--port',
+		type=int,
+		default=None,
+		required=False,
+		help='listen on this TCP port of localhost instead of a Unix socket.'
+	)
+	args = parser.parse_args()
+
+	# Read settings
+	with open(args.settings, 'r') as settingsFile:
+		settings = json.load(settingsFile)
+	defParams = getDefaults(__name__, 'params')
+	mergedParams = merge(defParams, settings)
+
+	# Only the spaces of the environment are needed
+	environment = envs.make(settings['task'])
+	stateDim = environment.observation_space.low.size
+	boundHigh = environment.action_space.high
+	boundLow = environment.action_space.low
+	environment.close()
+
+	# Serve
+	server = PolicyServer(mergedParams, stateDim, boundHigh, boundLow, args.checkpoint)
+	address = ('127.0.0.1', args.port) if args.port is not None else args.socket
+	server.serve(address, mergedParams['serve']['report-interval'])
+
+
+def olc_export():
+	parser = argparse.ArgumentParser(
+		description='Export the actor of a checkpoint with reduced precision.'
+	)
+	parser.add_argument(
+		'settings',
+		help='path to the settings file used for training.'
+	)
+	parser.add_argument(
+		'checkpoint',
+		help='path to the checkpoint file or directory to export.'
+	)
+	parser.add_argument(
+		'output',
+		help='prefix for the exported files.'
+	)
+	args = parser.parse_args()
+
+	# Read settings
+	with open(args.settings, 'r') as settingsFile:
+		settings = json.load(settingsFile)
+	defParams = getDefaults(__name__, 'params')
+	mergedParams = merge(defParams, settings)
+	checkpoint = args.checkpoint
+	if os.path.isdir(checkpoint):
+		checkpoint = tf.train.latest_checkpoint(checkpoint)
+
+	# Only the spaces of the environment are needed
+	environment = envs.make(settings['task'])
+	boundHigh = environment.action_space.high
+	boundLow = environment.action_space.low
+	environment.close()
+
+	# Export every precision, including float32
+	layers = readActor(checkpoint)
+	paths = []
+	for precision in ['float32'] + mergedParams['export']['precisions']:
+		path = '{}-{}.npz'.format(args.output, precision)
+		export(layers, boundHigh, boundLow, precision, path, mergedParams['actor']['activation'])
+		paths.append(path)
+
+	# Compare against the trained network on the replay buffer states
+	states = readStates(checkpoint, mergedParams['export']['samples'])
+	if len(states) == 0:
+		print('The replay buffer of the checkpoint is empty, skipping comparison.')
+		return
+	reference = referenceActions(mergedParams['actor'], checkpoint, states, boundHigh, boundLow)
+	print('Precision\tWeights\t\tMax error\tMean error')
+	for row in compare(paths, states, reference):
+		print('{}\t\t{:.1f} KiB\t{:.3e}\t{:.3e}'.format(
+			row['precision'], row['size'] / 2 ** 10, row['max-error'], row['mean-error']))
+	print('All precisions run with float32 kernels once loaded, so their speed is the same.')
+
+
+def olc_ensemble():
+	parser = argparse.ArgumentParser(
+		description='Train several independent agents with the same settings in one graph.'
+	)
+	parser.add_argument(
+		'settings',
+		help='path to the settings file.'
+	)
+	parser.add_argument(
+		'-k', '--agents',
+		type=int,
+		default=None,
+		required=False,
+		help='number of agents.'
+	)
+	parser.add_argument(
+		'-c', '--checkpoint',
+		default=None,
+		required=False,
+		help='path to a checkpoint file to load before training.'
+	)
+	parser.add_argument(
+		'-n', '--name',
+		default=None,
+		required=False,
+		help='name for the logs and checkpoints directories.'
+	)
+	args = parser.parse_args()
+
+	# Read settings
+	with open(args.settings, 'r') as settingsFile:
+		settings = json.load(settingsFile)
+	defParams = getDefaults(__name__, 'params')
+	mergedParams = merge(defParams, settings)
+	if args.agents is not None:
+		mergedParams['ensemble']['agents'] = args.agents
+
+	# Create one environment per agent, each with its own V-REP instance
+	pool = None
+	ports = settings['task'].get('simulation', {}).get('ports')
+	if ports is not None:
+		if len(ports) < mergedParams['ensemble']['agents']:
+			parser.error('{} agents need as many V-REP ports, {} given'.format(mergedParams['ensemble']['agents'], len(ports)))
+		pool = envs.makePool(settings['task'])
+	environments = []
+	for i in range(mergedParams['ensemble']['agents']):
+		environment = envs.make(settings['task'], pool)
+		if hasattr(environment, 'seed'):
+			environment.seed(mergedParams['ensemble']['seed'] + i)
+		environments.append(environment)
+
+	# Create logger
+	time = datetime.datetime.now().time()
+	if args.name is not None:
+		experimentName = args.name
+	else:
+		experimentName = '{}-ensemble-{:%H:%M}'.format(settings['task']['name'], time)
+	logger = Logger(experimentName, settings=mergedParams['logging'])
+
+	# Run
+	ensemble = Ensemble(mergedParams, environments, logger, args.checkpoint)
+	ensemble.run()
+	for environment in environments:
+		environment.close()
+	if pool is not None:
+		pool.close()
+	logger.close()
+
+
+def olc_offline():
+	parser = argparse.ArgumentParser(
+		description='Train a controller from recorded transitions only.'
+	)
+	parser.add_argument(
+		'settings',
+		help='path to the settings file.'
+	)
+	parser.add_argument(
+		'recordings',
+		nargs='+',
+		help='directories of the recordings to train on.'
+	)
+	parser.add_argument(
+		'-c', '--checkpoint',
+		default=None,
+		required=False,
+		help='path to a checkpoint file to load before training.'
+	)
+	parser.add_argument(
+		'-n', '--name',
+		default=None,
+		required=False,
+		help='name for the logs and checkpoints directories.'
+	)
+	args = parser.parse_args()
+
+	# Read settings
+	with open(args.settings, 'r') as settingsFile:
+		settings = json.load(settingsFile)
+
+	# The recordings describe the spaces, no environment is created
+	spaces = Spaces(args.recordings[0])
+
+	# Create logger
+	time = datetime.datetime.now().time()
+	if args.name is not None:
+		experimentName = args.name
+	else:
+		experimentName = '{}-offline-{:%H:%M}'.format(settings['task']['name'], time)
+	defParams = getDefaults(__name__, 'params')
+	mergedParams = merge(defParams, settings)
+	logger = Logger(experimentName, settings=mergedParams['logging'])
+
+	# Create controller
+	controller = Controller(mergedParams, spaces, logger, args.checkpoint)
+
+	# Run
+	controller.trainOffline(args.recordings)
+	logger.close()
+
+
+def olc_profile():
+	parser = argparse.ArgumentParser(
+		description='Measure the cost of the networks of one or more settings files.'
+	)
+	parser.add_argument(
+		'settings',
+		nargs='+',
+		help='paths to the settings files to compare.'
+	)
+	parser.add_argument(
+		'-r', '--repeats',
+		type=int,
+		default=1000,
+		required=False,
+		help='number of measurements for each timing.'
+	)
+	args = parser.parse_args()
+
+	defParams = getDefaults(__name__, 'params')
+	print('Settings\tActor\t\tCritic\t\tParameters\tMemory\t\tInference\tTraining')
+	for path in args.settings:
+		with open(path, 'r') as settingsFile:
+			settings = json.load(settingsFile)
+		mergedParams = merge(defParams, settings)
+		environment = envs.make(settings['task'])
+		stateDim = environment.observation_space.low.size
+		boundHigh = environment.action_space.high
+		boundLow = environment.action_space.low
+		environment.close()
+		report = profile(mergedParams, stateDim, boundHigh, boundLow, args.repeats)
+		print('{}\t{} FLOPs\t{} FLOPs\t{}\t\t{:.1f} KiB\t{:.3f}ms\t\t{:.3f}ms'.format(
+			path,
+			report['actor-flops'],
+			report['critic-flops'],
+			report['actor-parameters'] + report['critic-parameters'],
+			report['memory'] / 1024,
+			report['inference-time'] * 1e3,
+			report['training-time'] * 1e3
+		))
+
+
+def olc_report():
+	parser = argparse.ArgumentParser(
+		description='Aggregate the learning curves of many runs from their event files.'
+	)
+	parser.add_argument(
+		'directories',
+		nargs='+',
+		help='directories to search for runs, such as logs.'
+	)
+	parser.add_argument(
+		'-t', '--tags',
+		nargs='+',
+		default=REPORT_TAGS,
+		required=False,
+		help='scalar tags to report.'
+	)
+	parser.add_argument(
+		'-g', '--group',
+		default=None,
+		required=False,
+		help='regular expression whose first group names the group of a run; by default a trailing seed number is removed.'
+	)
+	parser.add_argument(
+		'-p', '--points',
+		type=int,
+		default=100,
+		required=False,
+		help='maximum number of steps of every curve.'
+	)
+	parser.add_argument(
+		'-o', '--output',
+		default=None,
+		required=False,
+		help='directory in which to write one CSV file per tag.'
+	)
+	parser.add_argument(
+		'-j', '--jobs',
+		type=int,
+		default=None,
+		required=False,
+		help='number of processes reading runs.'
+	)
+	args = parser.parse_args()
+
+	startTime = datetime.datetime.now()
+	tables = report(args.directories, args.tags, args.group, args.points, args.output, args.jobs)
+	for tag, groups in tables.items():
+		print(tag)
+		print('Group\tRuns\tStep\tMean\t95% interval')
+		for name, table in groups.items():
+			if len(table['step']) == 0:
+				continue
+			print('{}\t{}\t{}\t{:.4}\t[{:.4}, {:.4}]'.format(
+				name, table['n'], int(table['step'][-1]), table['mean'][-1], table['low'][-1], table['high'][-1]))
+	print('Done in {:.1f}s'.format((datetime.datetime.now() - startTime).total_seconds()))
+
+
+def olc_eval():
+	parser = argparse.ArgumentParser(
+		description='Evaluate every checkpoint of a run on a fixed set of seeded episodes.'
+	)
+	parser.add_argument(
+		'settings',
+		help='path to the settings file used for training.'
+	)
+	parser.add_argument(
+		'name',
+		help='name of the run, whose checkpoints are in checkpoints/<name>.'
+	)
+	parser.add_argument(
+		'-e', '--episodes',
+		type=int,
+		default=None,
+		required=False,
+		help='number of episodes per checkpoint.'
+	)
+	parser.add_argument(
+		'-j', '--jobs',
+		type=int,
+		default=None,
+		required=False,
+		help='number of processes evaluating checkpoints.'
+	)
+	args = parser.parse_args()
+
+	# Read settings
+	with open(args.settings, 'r') as settingsFile:
+		settings = json.load(settingsFile)
+	defParams = getDefaults(__name__, 'params')
+	mergedParams = merge(defParams, settings)
+	if args.episodes is not None:
+		mergedParams['evaluation']['episodes'] = args.episodes
+
+	# Evaluate the new checkpoints
+	startTime = datetime.datetime.now()
+	results, new = evaluate(mergedParams, os.path.join('checkpoints', args.name), args.jobs)
+
+	# New results join the learning curves of the run
+	if new:
+		logger = Logger(args.name)
+		for name in sorted(new, key=lambda n: results[n]['step']):
+			logger.logScalar('Evaluation', results[name]['mean'], results[name]['step'])
+		logger.close()
+	print('Checkpoint\tStep\tMean\t\tStd')
+	for name, result in sorted(results.items(), key=lambda x: x[1]['step']):
+		print('{}\t{}\t{:.4}\t\t{:.4}{}'.format(name, result['step'], result['mean'], result['std'], '\t(new)' if name in new else ''))
+	print('Evaluated {} checkpoints in {:.1f}s'.format(len(new), (datetime.datetime.now() - startTime).total_seconds()))
+
+
+def olc_library():
+	parser = argparse.ArgumentParser(
+		description='Add checkpoints to a policy library and list its entries.'
+	)
+	parser.add_argument(
+		'directory',
+		help='library directory.'
+	)
+	parser.add_argument(
+		'-a', '--add',
+		nargs='+',
+		default=[],
+		required=False,
+		help='checkpoint files or directories to add.'
+	)
+	parser.add_argument(
+		'-s', '--settings',
+		default=None,
+		required=False,
+		help='path to the settings file used to train the added checkpoints.'
+	)
+	args = parser.parse_args()
+
+	if args.add:
+		if args.settings is None:
+			parser.error('adding checkpoints needs their --settings')
+		with open(args.settings, 'r') as settingsFile:
+			settings = json.load(settingsFile)
+		defParams = getDefaults(__name__, 'params')
+		mergedParams = merge(defParams, settings)
+
+		# Only the spaces of the environment are needed
+		environment = envs.make(settings['task'])
+		stateDim = environment.observation_space.low.size
+		actionDim = environment.action_space.low.size
+		environment.close()
+
+		for checkpoint in args.add:
+			if os.path.isdir(checkpoint):
+				checkpoint = tf.train.latest_checkpoint(checkpoint)
+			entry = library.add(args.directory, checkpoint, mergedParams, stateDim, actionDim)
+			print('Added {} as {}'.format(checkpoint, entry['id']))
+
+	print('Entry\t\tTask\t\t\tState\tAction\tScore\tCheckpoint')
+	for entry in library.entries(args.directory):
+		score = '{:.4}'.format(entry['score']) if entry['score'] is not None else '-'
+		print('{}\t{}\t\t{}\t{}\t{}\t{}'.format(entry['id'], entry['task'], entry['state-dim'], entry['action-dim'], score, entry['checkpoint']))
+
+
+def olc_autotune():
+	parser = argparse.ArgumentParser(
+		description='Find the batch size and epoch cadence with the highest training throughput on this machine.'
+	)
+	parser.add_argument(
+		'settings',
+		help='path to the settings file.'
+	)
+	parser.add_argument(
+		'-r', '--ratio',
+		type=float,
+		default=None,
+		required=False,
+		help='updates per collected transition; by default, nb-train per nb-rollouts steps of every robot.'
+	)
+	parser.add_argument(
+		'-o', '--output',
+		default=None,
+		required=False,
+		help='path of the tuned settings file to write.'
+	)
+	args = parser.parse_args()
+
+	# Read settings
+	with open(args.settings, 'r') as settingsFile:
+		settings = json.load(settingsFile)
+	defParams = getDefaults(__name__, 'params')
+	mergedParams = merge(defParams, settings)
+
+	# Time every combination on the task
+	environment = envs.make(settings['task'])
+	results = autotune(mergedParams, environment, args.ratio)
+	environment.close()
+	print('Batch\tRollouts\tTrain\tEpoch\t\tTransitions/s\tSamples/s')
+	for row in results:
+		print('{}\t{}\t\t{}\t{:.3f}s\t\t{:.0f}\t\t{:.0f}'.format(
+			row['batch-size'], row['nb-rollouts'], row['nb-train'], row['time'], row['transitions'], row['samples']))
+
+	# Write the best combination
+	best = results[0]
+	for name in ['batch-size', 'nb-rollouts', 'nb-train']:
+		settings[name] = best[name]
+	if args.output is not None:
+		with open(args.output, 'w') as outputFile:
+			json.dump(settings, outputFile, indent='\t')
+		print('Wrote {}'.format(args.output))
+	else:
+		print(json.dumps({name: best[name] for name in ['batch-size', 'nb-rollouts', 'nb-train']}, indent='\t'))
@@ -11,11 +11,13 @@ Routines
 --------
 make
 	Create a new instance of the given environment.
+makePool
+	Launch or connect to several V-REP instances for a custom environment.
 """
 
 import gym.envs
 
-from .launcher import make, register
+from .launcher import make, makePool, register
 from .reach_torque import ReachTorque
 from .reach_velocity import ReachVelocity
 
@@ -0,0 +1,76 @@
+"""
+Vectorized goal relabeling for the reaching tasks.
+
+The goal of every reaching task is the position of a target, held in the
+first components of the state, and the achieved goal is the position of the
+end effector. Rewards depend on the goal through a potential, `-scale` times
+the distance to the goal, or through the distance left after the step, so
+they can be recomputed for another goal from the positions achieved before
+and after a transition, without changing the other terms of the reward.
+"""
+
+import numpy as np
+
+
+def relabelDistance(si, sf, r, achievedF, goals, scale=1):
+	"""
+	Change the goal of transitions rewarded with the final distance.
+
+	Parameters
+	----------
+	si, sf : numpy.ndarray
+		Initial and final states, one row per transition. They are modified.
+	r : numpy.ndarray
+		Rewards of the transitions.
+	achievedF : numpy.ndarray
+		Positions of the end effector after every transition.
+	goals : numpy.ndarray
+		New goals, one row per transition.
+	scale : float, optional
+		Weight of the distance in the reward.
+
+	Returns
+	-------
+	si, sf, r : numpy.ndarray
+		States and rewards for the new goals.
+	"""
+	dim = goals.shape[1]
+	r = r + scale * (_distance(achievedF, si[:, :dim]) - _distance(achievedF, goals))
+	si[:, :dim] = goals
+	sf[:, :dim] = goals
+	return si, sf, r
+
+
+def relabelPotential(si, sf, r, achievedI, achievedF, goals, scale):
+	"""
+	Change the goal of transitions rewarded with the change of a potential.
+
+	Parameters
+	----------
+	si, sf : numpy.ndarray
+		Initial and final states, one row per transition. They are modified.
+	r : numpy.ndarray
+		Rewards of the transitions.
+	achievedI, achievedF : numpy.ndarray
+		Positions of the end effector before and after every transition.
+	goals : numpy.ndarray
+		New goals, one row per transition.
+	scale : float
+		Factor of the distance in the potential.
+
+	Returns
+	-------
+	si, sf, r : numpy.ndarray
+		States and rewards for the new goals.
+	"""
+	dim = goals.shape[1]
+	old = si[:, :dim]
+	r = r + scale * (_distance(achievedF, old) - _distance(achievedI, old))
+	r = r - scale * (_distance(achievedF, goals) - _distance(achievedI, goals))
+	si[:, :dim] = goals
+	sf[:, :dim] = goals
+	return si, sf, r
+
+
+def _distance(a, b):
+	return np.linalg.norm(a - b, axis=1)
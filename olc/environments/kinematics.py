@@ -0,0 +1,149 @@
+"""
+Forward kinematics of serial robots.
+
+A robot is described by the Denavit-Hartenberg parameters of its joints, one
+row `[a, alpha, d, theta]` per joint with lengths in meters and angles in
+degrees (`theta` is added to the joint angle), the position and orientation
+of its base in the world, and the position of the tool point in the frame of
+the last joint. Orientations are V-REP Euler angles in degrees. Positions are
+computed for a whole batch of joint configurations at once.
+
+Routines
+--------
+ForwardKinematics
+	Positions of the tool point for a batch of joint configurations.
+EndEffectorDistance
+	Distance from the end effector to a reference, computed locally once it
+	matches the distance object of the simulation after a reset, and checked
+	against it periodically.
+fromSettings
+	Create the forward kinematics of a robot description.
+"""
+
+import numpy as np
+
+
+class ForwardKinematics:
+
+	def __init__(self, dh, basePosition=(0, 0, 0), baseOrientation=(0, 0, 0), tool=(0, 0, 0)):
+		dh = np.asarray(dh, float)
+		self.a = dh[:, 0]
+		self.d = dh[:, 2]
+		self.offset = np.radians(dh[:, 3])
+		alpha = np.radians(dh[:, 1])
+		self.cosAlpha = np.cos(alpha)
+		self.sinAlpha = np.sin(alpha)
+		self.base = np.eye(4)
+		self.base[:3, :3] = _eulerMatrix(np.radians(baseOrientation))
+		self.base[:3, 3] = basePosition
+		self.tool = np.append(np.asarray(tool, float), 1)
+
+	def distance(self, q, reference):
+		return np.linalg.norm(self.position(q) - reference, axis=-1)
+
+	def position(self, q):
+		q = np.asarray(q, float)
+		theta = q.reshape(-1, q.shape[-1]) + self.offset
+		cosTheta = np.cos(theta)
+		sinTheta = np.sin(theta)
+		transforms = np.zeros(theta.shape + (4, 4))
+		transforms[..., 0, 0] = cosTheta
+		transforms[..., 0, 1] = -sinTheta * self.cosAlpha
+		transforms[..., 0, 2] = sinTheta * self.sinAlpha
+		transforms[..., 0, 3] = self.a * cosTheta
+		transforms[..., 1, 0] = sinTheta
+		transforms[..., 1, 1] = cosTheta * self.cosAlpha
+		transforms[..., 1, 2] = -cosTheta * self.sinAlpha
+		transforms[..., 1, 3] = self.a * sinTheta
+		transforms[..., 2, 1] = self.sinAlpha
+		transforms[..., 2, 2] = self.cosAlpha
+		transforms[..., 2, 3] = self.d
+		transforms[..., 3, 3] = 1
+		total = np.broadcast_to(self.base, (theta.shape[0], 4, 4))
+		for i in range(theta.shape[1]):
+			total = np.matmul(total, transforms[:, i])
+		position = np.matmul(total, self.tool)[:, :3]
+		return position.reshape(q.shape[:-1] + (3,))
+
+
+class EndEffectorDistance:
+
+	def __init__(self, robot, simulation, objectName):
+		self.sim = simulation
+		self.objectName = objectName
+		self.kinematics = fromSettings(robot)
+		self.steps = 0
+		self.verified = False
+		if self.kinematics is not None:
+			self.checkInterval = robot['kinematics']['check-interval']
+			self.tolerance = robot['kinematics']['tolerance']
+
+	@property
+	def local(self):
+		return self.kinematics is not None
+
+	def check(self, q, reference):
+		# Only called once a step is done, when the streamed distance is current
+		simulated = self.sim.readDistance(self.objectName)
+		if simulated is None:
+			return None
+		distance = self.kinematics.distance(q, reference)
+		if abs(distance - simulated) > self.tolerance:
+			# Wrong parameters would silently change the reward
+			raise RuntimeError('Local end effector distance {:.4f} differs from V-REP\'s {:.4f}, check the kinematics of the robot'.format(
+				distance, simulated))
+		self.verified = True
+		return distance
+
+	def read(self, q, reference, check=True):
+		if self.kinematics is None:
+			return self.sim.readDistance(self.objectName)
+		if not self.verified:
+			# V-REP's distance is used until the local one has been checked
+			distance = self.check(q, reference) if check else None
+			return distance if distance is not None else self.sim.readDistance(self.objectName)
+		self.steps += 1
+		if check and self.checkInterval > 0 and self.steps % self.checkInterval == 0:
+			self.check(q, reference)
+		return self.kinematics.distance(q, reference)
+
+	def reset(self, q, reference):
+		# Every episode starts with a check of the new pose and reference
+		self.verified = False
+		if self.kinematics is not None:
+			self.check(q, reference)
+
+
+def fromSettings(robot):
+	"""
+	Create the forward kinematics of a robot description.
+
+	Parameters
+	----------
+	robot : dict
+		Robot settings of a V-REP task, with a `kinematics` object holding
+		the `dh` table and, optionally, `base-position`, `base-orientation`,
+		`tool` and `enabled`.
+
+	Returns
+	-------
+	kinematics : ForwardKinematics or None
+		Forward kinematics of the robot, or None if it has no enabled
+		`kinematics`.
+	"""
+	specs = robot.get('kinematics')
+	if specs is None or not specs.get('enabled', True):
+		return None
+	if len(specs['dh']) != len(robot['joints']):
+		raise ValueError('The DH table has {} rows for {} joints'.format(len(specs['dh']), len(robot['joints'])))
+	return ForwardKinematics(specs['dh'], specs.get('base-position', (0, 0, 0)), specs.get('base-orientation', (0, 0, 0)),
+		specs.get('tool', (0, 0, 0)))
+
+
+def _eulerMatrix(angles):
+	# V-REP convention: rotations about x, y and z of the rotating frame
+	alpha, beta, gamma = angles
+	rx = np.array([[1, 0, 0], [0, np.cos(alpha), -np.sin(alpha)], [0, np.sin(alpha), np.cos(alpha)]])
+	ry = np.array([[np.cos(beta), 0, np.sin(beta)], [0, 1, 0], [-np.sin(beta), 0, np.cos(beta)]])
+	rz = np.array([[np.cos(gamma), -np.sin(gamma), 0], [np.sin(gamma), np.cos(gamma), 0], [0, 0, 1]])
+	return rx @ ry @ rz
@@ -1,19 +1,76 @@
 import roboschool
-from olc.environments.simulation import Simulation
+from olc.environments.multi_robot import MultiRobot
+from olc.environments.simulation import Simulation, SimulationPool
+from olc.environments.wrappers import ActionRepeat
 from olc.settings import getDefaults, merge
 
 _registry = {}
 
 
-def make(settings):
+def make(settings, pool=None):
+	"""
+	Create a new instance of the given environment.
+
+	If the settings have an `action-repeat` greater than one, every action is
+	applied for that many steps of the environment, with the rewards added and
+	the errors averaged. If they have a `robots` count greater than one, that
+	many copies of a Roboschool robot share one physics world, and the
+	environment works with one row per robot.
+
+	Parameters
+	----------
+	settings : dict
+		Task settings. The environment is selected with the `name` key.
+	pool : SimulationPool, optional
+		Pool from which to take the V-REP instance of custom environments. If
+		not given, a new connection is made using the `simulation` settings.
+
+	Returns
+	-------
+	environment
+		New environment.
+	"""
+	if settings.get('robots', 1) > 1:
+		environment = MultiRobot(settings['name'], settings['robots'])
+	else:
+		environment = _make(settings, pool)
+	if settings.get('action-repeat', 1) > 1:
+		environment = ActionRepeat(environment, settings['action-repeat'])
+	return environment
+
+
+def makePool(settings):
+	"""
+	Launch or connect to the V-REP instances of a custom environment.
+
+	Parameters
+	----------
+	settings : dict
+		Task settings, with a `simulation` object listing the ports to use.
+
+	Returns
+	-------
+	pool : SimulationPool
+		Pool with one connection per port.
+	"""
+	defs = getDefaults(__name__, settings['name'].lower())
+	mergedSettings = merge(defs, settings)
+	return SimulationPool(mergedSettings['robot'], mergedSettings['simulation'])
+
+
+def _make(settings, pool):
 	try:
 		import gym
 		return gym.make(settings['name'])
 	except:
 		pass
-	simulation = Simulation(settings['robot'])
 	defs = getDefaults(__name__, settings['name'].lower())
 	mergedSettings = merge(defs, settings)
+	if pool is not None:
+		simulation = pool.acquire()
+	else:
+		sim = mergedSettings['simulation']
+		simulation = Simulation(mergedSettings['robot'], sim['host'], sim['ports'][0], sim['connect-attempts'], sim['timeout'])
 	return _registry[settings['name']](mergedSettings, simulation)
 
 
@@ -0,0 +1,78 @@
+"""
+Several Roboschool robots in one physics world.
+
+`MultiRobot` loads `n` copies of a Roboschool robot in a shared zero-gravity
+scene and advances all of them with a single `global_step`. Observations,
+rewards and terminal flags are arrays with one row per robot, and actions are
+expected in the same layout. The robots must provide `observe`, which builds
+the transition of a robot once the scene has stepped, as the Reacher classes
+of this package do. Their geometries do not collide, so the copies share the
+origin without interacting.
+
+All robots start and end their episodes together, since restarting the
+episode of the scene removes every robot from the world.
+"""
+
+import gym
+import numpy as np
+from roboschool.scene_abstract import Scene
+
+
+class MultiRobotEmptyScene(Scene):
+
+	multiplayer = True
+
+
+class MultiRobot:
+
+	def __init__(self, name, n):
+		self.robots = [gym.make(name).unwrapped for _ in range(n)]
+		if not hasattr(self.robots[0], 'observe'):
+			raise ValueError('Task "{}" does not support several robots'.format(name))
+		self.nbRobots = n
+		self.maxSteps = gym.spec(name).max_episode_steps
+		self.action_space = self.robots[0].action_space
+		self.observation_space = self.robots[0].observation_space
+		# Same time step as the scene of a single robot
+		template = self.robots[0].create_single_player_scene()
+		self.scene = MultiRobotEmptyScene(gravity=0.0, timestep=template.timestep, frame_skip=template.frame_skip)
+		for robot in self.robots:
+			robot.scene = self.scene
+		self.steps = 0
+		self.goalDim = getattr(self.robots[0], 'goalDim', None)
+
+	def achievedGoal(self):
+		return np.array([robot.achievedGoal() for robot in self.robots])
+
+	def close(self):
+		for robot in self.robots:
+			robot.close()
+
+	def relabel(self, *args):
+		return self.robots[0].relabel(*args)
+
+	def render(self, *args, **kwargs):
+		return self.robots[0].render(*args, **kwargs)
+
+	def reset(self):
+		self.scene.episode_restart()
+		self.steps = 0
+		return np.array([robot.reset() for robot in self.robots])
+
+	def step(self, actions):
+		for robot, action in zip(self.robots, actions):
+			robot.apply_action(action)
+		self.scene.global_step()
+		states = []
+		rewards = []
+		errors = []
+		for robot, action in zip(self.robots, actions):
+			state, reward, _, info = robot.observe(action)
+			states.append(state)
+			rewards.append(reward)
+			if 'error' in info:
+				errors.append(info['error'])
+		self.steps += 1
+		done = np.full(self.nbRobots, self.maxSteps is not None and self.steps >= self.maxSteps)
+		info = {'errors': np.array(errors), 'error': np.mean(errors)} if errors else {}
+		return np.array(states), np.array(rewards), done, info
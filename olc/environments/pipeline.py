@@ -0,0 +1,52 @@
+"""
+Overlap of the simulation with the work of the controller.
+
+V-REP tasks split a step in two halves: `send` applies the action and triggers
+the next step of the synchronous simulation, and `receive` waits until the
+step is done and reads the streamed joint and distance buffers. A threaded
+`Pipeline` runs `receive` in a worker thread, so the controller can store and
+log the previous transition while the simulator computes the current one. At
+most one step is in flight: `send` cannot be called again before `receive`.
+
+Environments without these halves, or pipelines that are not threaded, are
+stepped at once in `send`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from olc.environments.wrappers import ActionRepeat
+
+
+class Pipeline:
+
+	def __init__(self, environment, threaded):
+		self.env = environment
+		self.threaded = threaded and _splittable(environment)
+		self.executor = ThreadPoolExecutor(1) if self.threaded else None
+		self.pending = None
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+
+	def receive(self):
+		if self.pending is None:
+			raise RuntimeError('No step in flight')
+		pending = self.pending
+		self.pending = None
+		return pending.result() if self.threaded else pending
+
+	def send(self, action):
+		if self.pending is not None:
+			raise RuntimeError('A step is already in flight')
+		if self.threaded:
+			self.env.send(action)
+			self.pending = self.executor.submit(self.env.receive)
+		else:
+			self.pending = self.env.step(action)
+
+
+def _splittable(environment):
+	while isinstance(environment, ActionRepeat):
+		environment = environment.env
+	return hasattr(environment, 'receive')
@@ -1,9 +1,16 @@
 import numpy as np
 from gym.spaces import Box
 
+from olc.environments.goals import relabelDistance
+from olc.environments.kinematics import EndEffectorDistance, fromSettings
+
 
 class ReachTorque:
 
+	goalDim = 3
+	# The reward depends on the distance after every step, not on its change
+	relabelsRepeatedSteps = False
+
 	def __init__(self, settings, simulation):
 		self.settings = settings
 		self.sim = simulation
@@ -12,8 +19,16 @@ class ReachTorque:
 		self.action_space = Box(-np.array(settings['robot']['max-torques']), np.array(settings['robot']['max-torques']))
 		self.observation_space = Box(stateMin, stateMax)
 		self.sim.readDistance(settings['error-object-name'])
+		self.distance = EndEffectorDistance(settings['robot'], self.sim, settings['error-object-name'])
+		self.kinematics = fromSettings(settings['robot'])
 		self.rewardVelFactor = 1 / np.linalg.norm(np.radians(settings['robot']['max-velocities']))
 
+	def achievedGoal(self):
+		if self.kinematics is None:
+			raise ValueError('Goal relabeling needs the kinematics of the robot')
+		workspace = len(self.settings['robot']['workspace-min'])
+		return self.kinematics.position(self.state[workspace:workspace + len(self.settings['robot']['joints'])])
+
 	def close(self):
 		self.sim.close()
 
@@ -26,20 +41,39 @@ class ReachTorque:
 		self.sim.setPose(pose)
 		self.sim.setVelocities(np.zeros(self.action_space.low.size))
 		self.sim.start()
-		self.sim.step()
+		if self.sim.step():
+			# The pose was set on the lost connection
+			return self.reset()
+		self.sim.wait()
 		self.state[len(self.settings['robot']['workspace-min']):] = np.concatenate(self.sim.getRobotState())
+		workspace = len(self.settings['robot']['workspace-min'])
+		self.distance.reset(self.state[workspace:workspace + len(self.settings['robot']['joints'])], ref)
 		self.curStep = 0
-		return self.state
+		return self.state.copy()
+
+	def relabel(self, si, sf, r, achievedI, achievedF, goals):
+		return relabelDistance(si, sf, r, achievedF, goals)
 
 	def render(self):
 		pass
 
-	def step(self, action):
-		self.curStep += 1
-		self.sim.setTorques(action)
-		self.sim.step()
+	def receive(self):
+		self.sim.wait()
 		self.state[len(self.settings['robot']['workspace-min']):] = np.concatenate(self.sim.getRobotState())
-		error = self.sim.readDistance(self.settings['error-object-name'])
+		workspace = len(self.settings['robot']['workspace-min'])
+		joints = len(self.settings['robot']['joints'])
+		error = self.distance.read(self.state[workspace:workspace + joints], self.state[:workspace])
 		reward = -error - np.linalg.norm(self.state[-self.action_space.low.size:]) * self.rewardVelFactor
-		reset = self.curStep >= self.settings['max-steps']
-		return self.state, reward, reset, None
+		# An episode cut by a reconnection is reset
+		reset = self.curStep >= self.settings['max-steps'] or self.restarted
+		# A copy, as the state array is updated in place by the next step
+		return self.state.copy(), reward, reset, None
+
+	def send(self, action):
+		self.curStep += 1
+		self.sim.setTorques(action)
+		self.restarted = self.sim.step()
+
+	def step(self, action):
+		self.send(action)
+		return self.receive()
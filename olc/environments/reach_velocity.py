@@ -3,9 +3,14 @@ import time
 import numpy as np
 from gym.spaces import Box
 
+from olc.environments.goals import relabelPotential
+from olc.environments.kinematics import EndEffectorDistance, fromSettings
+
 
 class ReachVelocity:
 
+	goalDim = 3
+
 	def __init__(self, settings, simulation):
 		self.settings = settings
 		self.sim = simulation
@@ -14,8 +19,15 @@ class ReachVelocity:
 		self.action_space = Box(-np.array(settings['robot']['max-velocities']), np.array(settings['robot']['max-velocities']))
 		self.observation_space = Box(stateMin, stateMax)
 		self.sim.readDistance(settings['error-object-name'])
+		self.distance = EndEffectorDistance(settings['robot'], self.sim, settings['error-object-name'])
+		self.kinematics = fromSettings(settings['robot'])
 		self.rewardVelFactor = 1 / np.linalg.norm(np.radians(settings['robot']['max-velocities']))
 
+	def achievedGoal(self):
+		if self.kinematics is None:
+			raise ValueError('Goal relabeling needs the kinematics of the robot')
+		return self.kinematics.position(self.pose)
+
 	def close(self):
 		self.sim.close()
 
@@ -28,27 +40,45 @@ class ReachVelocity:
 		self.sim.setPose(self.pose)
 		self.sim.setVelocities(np.zeros(self.action_space.low.size))
 		self.sim.start()
-		self.sim.step()
+		if self.sim.step():
+			# The pose was set on the lost connection
+			return self.reset()
+		self.sim.wait()
 		self.pose = self.sim.getRobotState()[0]
+		self.distance.reset(self.pose, self.reference)
 		self.curStep = 0
-		time.sleep(0.05)
-		self.potential = self._computePotential()
+		if not self.distance.local:
+			# Let the streamed distance catch up with the new pose
+			time.sleep(0.05)
+		self.potential = self._computePotential(check=False)
 		return np.concatenate((self.reference, self.pose))
 
+	def relabel(self, si, sf, r, achievedI, achievedF, goals):
+		return relabelPotential(si, sf, r, achievedI, achievedF, goals, 1000)
+
 	def render(self):
 		pass
 
-	def step(self, action):
-		self.curStep += 1
-		self.sim.setVelocities(action)
-		self.sim.step()
+	def receive(self):
+		self.sim.wait()
 		self.pose = self.sim.getRobotState()[0]
-		reward = self._computeReward(action)
-		reset = self.curStep >= self.settings['max-steps']
+		reward = self._computeReward(self.action)
+		# An episode cut by a reconnection is reset
+		reset = self.curStep >= self.settings['max-steps'] or self.restarted
 		return np.concatenate((self.reference, self.pose)), reward, reset, None
 
-	def _computePotential(self):
-		return -1000 * self.sim.readDistance(self.settings['error-object-name'])
+	def send(self, action):
+		self.curStep += 1
+		self.action = action
+		self.sim.setVelocities(action)
+		self.restarted = self.sim.step()
+
+	def step(self, action):
+		self.send(action)
+		return self.receive()
+
+	def _computePotential(self, check=True):
+		return -1000 * self.distance.read(self.pose, self.reference, check)
 
 	def _computeReward(self, action):
 		newPotential = self._computePotential()
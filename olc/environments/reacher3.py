@@ -1,5 +1,6 @@
 from roboschool.scene_abstract import SingleRobotEmptyScene
 from roboschool.gym_mujoco_xml_env import RoboschoolMujocoXmlEnv
+from olc.environments.goals import relabelPotential
 import numpy as np
 
 
@@ -8,6 +9,9 @@ class Reacher3(RoboschoolMujocoXmlEnv):
     Get the end of two-link robotic arm to a given spot.
     Similar to MuJoCo reacher.
     '''
+
+    goalDim = 2
+
     def __init__(self):
         RoboschoolMujocoXmlEnv.__init__(self, self.definitionFile, 'body0', action_dim=3, obs_dim=11)
 
@@ -61,7 +65,9 @@ class Reacher3(RoboschoolMujocoXmlEnv):
         assert(not self.scene.multiplayer)
         self.apply_action(a)
         self.scene.global_step()
+        return self.observe(a)
 
+    def observe(self, a):
         state = self.calc_state()  # sets self.to_target_vec
 
         potential_old = self.potential
@@ -81,6 +87,16 @@ class Reacher3(RoboschoolMujocoXmlEnv):
         error = np.sqrt(state[2] ** 2 + state[3] ** 2)
         return state, sum(self.rewards), False, {'error': error}
 
+    def achievedGoal(self):
+        return np.array(self.fingertip.pose().xyz())[:2]
+
+    def relabel(self, si, sf, r, achievedI, achievedF, goals):
+        si, sf, r = relabelPotential(si, sf, r, achievedI, achievedF, goals, 100)
+        # Vector from the target to the fingertip
+        si[:, 2:4] = achievedI - goals
+        sf[:, 2:4] = achievedF - goals
+        return si, sf, r
+
     def camera_adjust(self):
         x, y, z = self.fingertip.pose().xyz()
         x *= 0.5
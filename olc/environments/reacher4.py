@@ -1,10 +1,13 @@
 import numpy as np
 from roboschool.scene_abstract import SingleRobotEmptyScene
 from roboschool.gym_mujoco_xml_env import RoboschoolMujocoXmlEnv
+from olc.environments.goals import relabelPotential
 
 
 class Reacher4(RoboschoolMujocoXmlEnv):
 
+	goalDim = 3
+
 	def __init__(self):
 		self.action_dim = 3
 		self.obs_dim = 9
@@ -53,6 +56,9 @@ class Reacher4(RoboschoolMujocoXmlEnv):
 		assert(not self.scene.multiplayer)
 		self.apply_action(a)
 		self.scene.global_step()
+		return self.observe(a)
+
+	def observe(self, a):
 		state = self.calc_state()
 		potential_old = self.potential
 		self.potential = self.calc_potential()
@@ -65,6 +71,15 @@ class Reacher4(RoboschoolMujocoXmlEnv):
 		self.HUD(state, a, False)
 		return state, sum(self.rewards), False, {}
 
+	def achievedGoal(self):
+		# In the coordinates of the target joints, which start from the origin of the target body
+		joints = [self.jdict[key].current_position()[0] for key in ['target_x', 'target_y', 'target_z']]
+		offset = np.array(self.target.pose().xyz()) - joints
+		return np.array(self.fingertip.pose().xyz()) - offset
+
+	def relabel(self, si, sf, r, achievedI, achievedF, goals):
+		return relabelPotential(si, sf, r, achievedI, achievedF, goals, 100)
+
 	def camera_adjust(self):
 		x, y, z = self.fingertip.pose().xyz()
 		x *= 0.5
@@ -0,0 +1,87 @@
+"""
+Rendering at a fixed frame rate, apart from the control loop.
+
+Rendering a Roboschool environment in the training process draws a frame and
+updates the HUD on every step, which ties the speed of the controller to the
+display. A `Renderer` with a frame rate instead starts a process with its own
+copy of the task, and at most `fps` times per second copies the positions and
+velocities of the joints of the trained robot to shared memory. The process
+applies the latest snapshot to its copy and draws it at the same rate, so the
+training process never draws anything.
+
+Environments without Roboschool joints (V-REP tasks, which are shown by
+V-REP itself, and other Gym environments) are rendered in the control loop,
+at most `fps` times per second. Without a frame rate, every step is
+rendered in the control loop.
+"""
+
+import multiprocessing
+import time
+
+import gym
+
+from olc.environments.multi_robot import MultiRobot
+from olc.environments.wrappers import ActionRepeat
+
+
+class Renderer:
+
+	def __init__(self, environment, name, fps=None):
+		self.env = environment
+		self.interval = 1. / fps if fps else 0.
+		self.last = 0.
+		self.robot = _robot(environment)
+		self.process = None
+		if fps and hasattr(self.robot, 'jdict'):
+			self.joints = list(self.robot.jdict.values())
+			context = multiprocessing.get_context('spawn')
+			self.snapshot = context.Array('d', 2 * len(self.joints))
+			self.stop = context.Event()
+			self.process = context.Process(target=_show, args=(name, self.snapshot, self.stop, fps), daemon=True)
+			self.process.start()
+
+	def close(self):
+		if self.process is not None:
+			self.stop.set()
+			self.process.join()
+			self.process = None
+
+	def update(self):
+		now = time.monotonic()
+		if now - self.last < self.interval:
+			return
+		self.last = now
+		if self.process is None:
+			self.env.render()
+			return
+		values = [x for joint in self.joints for x in joint.current_position()]
+		with self.snapshot.get_lock():
+			self.snapshot[:] = values
+
+
+def _robot(environment):
+	while isinstance(environment, ActionRepeat):
+		environment = environment.env
+	if isinstance(environment, MultiRobot):
+		environment = environment.robots[0]
+	return getattr(environment, 'unwrapped', environment)
+
+
+def _show(name, snapshot, stop, fps):
+	# Unpickling this function imported olc.environments, which registers the tasks
+	env = gym.make(name).unwrapped
+	env.reset()
+	joints = list(env.jdict.values())
+	interval = 1. / fps
+	deadline = time.monotonic()
+	while not stop.wait(max(0., deadline - time.monotonic())):
+		# Frames that could not be drawn in time are skipped
+		deadline = max(deadline + interval, time.monotonic())
+		with snapshot.get_lock():
+			values = snapshot[:]
+		for i, joint in enumerate(joints):
+			joint.reset_current_position(values[2 * i], values[2 * i + 1])
+		# The poses of the bodies are only updated by a physics step
+		env.scene.global_step()
+		env.render('human')
+	env.close()
@@ -1,25 +1,67 @@
+"""
+Connection to V-REP through its remote API.
+
+Routines
+--------
+SimulationPool
+	Group of V-REP instances that are handed out to environments.
+"""
+
+import subprocess
+import threading
+import time
+
 import numpy as np
 import vrep
 
 
 class Simulation:
 
-	def __init__(self, robot):
-		self.id = vrep.simxStart('127.0.0.1', 19997, True, True, 1000, 5)
-		if self.id == -1:
-			exit('Connection to V-REP failed.')
+	def __init__(self, robot, host='127.0.0.1', port=19997, attempts=5, timeout=1000):
+		self.robot = robot
+		self.host = host
+		self.port = port
+		self.attempts = attempts
+		self.timeout = timeout
+		self.pool = None
+		self.id = -1
+		self.connect()
+
+	def connect(self):
+		for attempt in range(self.attempts):
+			self.id = vrep.simxStart(self.host, self.port, True, True, self.timeout, 5)
+			if self.id != -1:
+				break
+			time.sleep(min(2 ** attempt * 0.1, 5))
+		else:
+			raise ConnectionError('Connection to V-REP at {}:{} failed.'.format(self.host, self.port))
 		self.running = False
 		self.joints = []
-		for joint in robot['joints']:
+		for joint in self.robot['joints']:
 			self.joints.append(vrep.simxGetObjectHandle(self.id, joint, vrep.simx_opmode_blocking)[1])
 			vrep.simxGetJointPosition(self.id, self.joints[-1], vrep.simx_opmode_streaming)
 			vrep.simxGetObjectFloatParameter(self.id, self.joints[-1], vrep.sim_jointfloatparam_velocity, vrep.simx_opmode_streaming)
+		# Handles are looked up again on demand
+		names = list(getattr(self, 'distances', {}).keys())
 		self.distances = {}
 		self.dummies = {}
+		for name in names:
+			self.readDistance(name)
+
+	def healthy(self):
+		return self.id != -1 and vrep.simxGetConnectionId(self.id) != -1
+
+	def reconnect(self):
+		if self.id != -1:
+			vrep.simxFinish(self.id)
+		self.connect()
 
 	def close(self):
 		self.stop()
-		vrep.simxFinish(self.id)
+		if self.pool is not None:
+			self.pool.release(self)
+		else:
+			vrep.simxFinish(self.id)
 
 	def getRobotState(self):
 		pos = np.zeros(len(self.joints))
@@ -75,9 +117,61 @@ class Simulation:
 			self.running = True
 
 	def step(self):
+		# Returns True if the connection was lost, the simulation then starts over
+		if vrep.simxSynchronousTrigger(self.id) == vrep.simx_return_ok or self.healthy():
+			return False
+		print('Connection to V-REP at {}:{} lost, reconnecting.'.format(self.host, self.port))
+		self.reconnect()
+		self.start()
 		vrep.simxSynchronousTrigger(self.id)
+		return True
 
 	def stop(self):
 		if self.running:
 			vrep.simxStopSimulation(self.id, vrep.simx_opmode_blocking)
 			self.running = False
+
+	def wait(self):
+		# A round trip returns after the triggered step is done and streamed
+		vrep.simxGetPingTime(self.id)
+
+
+class SimulationPool:
+
+	def __init__(self, robot, settings):
+		self.robot = robot
+		self.settings = settings
+		self.processes = []
+		if settings['launch'] is not None:
+			for port in settings['ports']:
+				self.processes.append(subprocess.Popen(settings['launch'].format(port=port), shell=True))
+		self.free = []
+		for port in settings['ports']:
+			self.free.append(self._connect(port))
+		self.lock = threading.Condition()
+
+	def acquire(self):
+		with self.lock:
+			while not self.free:
+				self.lock.wait()
+			simulation = self.free.pop(0)
+		if not simulation.healthy():
+			simulation.reconnect()
+		return simulation
+
+	def close(self):
+		for simulation in self.free:
+			simulation.pool = None
+			simulation.close()
+		for process in self.processes:
+			process.terminate()
+
+	def release(self, simulation):
+		with self.lock:
+			self.free.append(simulation)
+			self.lock.notify()
+
+	def _connect(self, port):
+		simulation = Simulation(self.robot, self.settings['host'], port, self.settings['connect-attempts'], self.settings['timeout'])
+		simulation.pool = self
+		return simulation
@@ -0,0 +1,55 @@
+"""Wrappers that change how environments are stepped."""
+
+import numpy as np
+
+
+class ActionRepeat:
+
+	def __init__(self, environment, repeat):
+		self.env = environment
+		self.repeat = repeat
+		self.action_space = environment.action_space
+		self.observation_space = environment.observation_space
+
+	def __getattr__(self, name):
+		return getattr(self.env, name)
+
+	def close(self):
+		self.env.close()
+
+	def render(self, *args, **kwargs):
+		return self.env.render(*args, **kwargs)
+
+	def reset(self):
+		return self.env.reset()
+
+	def receive(self):
+		def stepSent(n):
+			if n > 1:
+				self.env.send(self.action)
+			return self.env.receive()
+		return self._repeat(stepSent)
+
+	def send(self, action):
+		# The first step is triggered here, the others while receiving
+		self.action = action
+		self.env.send(action)
+
+	def step(self, action):
+		return self._repeat(lambda n: self.env.step(action))
+
+	def _repeat(self, step):
+		totalReward = 0
+		errors = []
+		for n in range(1, self.repeat + 1):
+			state, reward, done, info = step(n)
+			totalReward += reward
+			if isinstance(info, dict) and 'error' in info:
+				errors.append(info['error'])
+			if np.any(done):
+				break
+		info = dict(info) if isinstance(info, dict) else {}
+		if errors:
+			info['error'] = np.mean(errors)
+		info['physics-steps'] = n
+		return state, totalReward, done, info
@@ -0,0 +1,179 @@
+"""
+Evaluation of saved checkpoints on a fixed set of episodes.
+
+Every checkpoint of a run is scored on the same episodes: episode `i` starts
+after seeding the environment, its spaces and NumPy with `seed + i`, which
+fixes the targets and initial poses drawn by the tasks of this package. The
+actor of each checkpoint is read with `readActor` and evaluated with NumPy,
+stepping `batch` environments side by side so the actions of all of them are
+computed at once. Checkpoints are shared out between worker processes that
+keep their environments open for the whole evaluation.
+
+Results are stored in `evaluation.json` in the checkpoint directory, keyed by
+checkpoint name, together with the episodes they were computed on. Later
+evaluations of the same run only score checkpoints that are new or were
+overwritten, and keep the results of checkpoints removed since.
+"""
+
+import glob
+import io
+import json
+import multiprocessing
+import os
+import re
+
+import gym
+import numpy as np
+
+import olc.environments as envs
+from olc.quantization import QuantizedActor, export, readActor
+
+RESULTS_NAME = 'evaluation.json'
+# Environments of a worker process, created once by _startWorker
+_worker = {}
+
+
+def checkpoints(directory):
+	"""
+	List the checkpoints of a directory, by step.
+
+	Parameters
+	----------
+	directory : str
+		Checkpoint directory of a run.
+
+	Returns
+	-------
+	paths : list of str
+		Checkpoint prefixes, sorted by their step.
+	"""
+	paths = []
+	for index in glob.glob(os.path.join(directory, '*.index')):
+		path = index[:-len('.index')]
+		match = re.search(r'-(\d+)$', path)
+		if match:
+			paths.append((int(match.group(1)), path))
+	return [path for _, path in sorted(paths)]
+
+
+def evaluate(settings, directory, jobs=None):
+	"""
+	Evaluate the checkpoints of a run that have no stored result.
+
+	Parameters
+	----------
+	settings : dict
+		Complete settings object used for training, including the `evaluation`
+		settings.
+	directory : str
+		Checkpoint directory of the run.
+	jobs : int, optional
+		Number of worker processes. By default, one per V-REP instance listed
+		in the task, or one per CPU.
+
+	Returns
+	-------
+	results : dict
+		Results of every checkpoint evaluated so far, by checkpoint name, with
+		the `step`, the `returns` of every episode and their `mean` and `std`.
+	new : list of str
+		Names of the checkpoints evaluated by this call.
+	"""
+	specs = settings['evaluation']
+	grid = {'episodes': specs['episodes'], 'seed': specs['seed'], 'task': settings['task']}
+	path = os.path.join(directory, RESULTS_NAME)
+	try:
+		with open(path, 'r') as resultsFile:
+			stored = json.load(resultsFile)
+	except (OSError, ValueError):
+		stored = {}
+	# Results computed on other episodes cannot be compared
+	results = stored.get('results', {}) if stored.get('grid') == grid else {}
+	pending = []
+	for checkpoint in checkpoints(directory):
+		name = os.path.basename(checkpoint)
+		modified = os.path.getmtime(checkpoint + '.index')
+		if name not in results or results[name]['modified'] != modified:
+			pending.append((checkpoint, modified))
+	if not pending:
+		return results, []
+	task = json.loads(json.dumps(settings['task']))
+	task.pop('robots', None)
+	batch = min(specs['batch'], specs['episodes'])
+	ports = task.get('simulation', {}).get('ports')
+	if ports is not None:
+		if len(ports) < batch:
+			raise ValueError('Evaluating {} episodes at once needs as many V-REP ports, {} given'.format(batch, len(ports)))
+		jobs = min(jobs or len(ports) // batch, len(ports) // batch)
+	jobs = min(jobs or os.cpu_count(), len(pending))
+	context = multiprocessing.get_context('spawn')
+	slots = context.Queue()
+	for port in ports or []:
+		slots.put(port)
+	episodes = [specs['seed'] + i for i in range(specs['episodes'])]
+	activation = settings['actor']['activation']
+	with context.Pool(jobs, _startWorker, (task, batch, slots)) as pool:
+		scores = pool.starmap(_evaluateCheckpoint, [(checkpoint, episodes, activation) for checkpoint, _ in pending])
+	new = []
+	for (checkpoint, modified), returns in zip(pending, scores):
+		name = os.path.basename(checkpoint)
+		results[name] = {
+			'step': int(re.search(r'-(\d+)$', checkpoint).group(1)),
+			'modified': modified,
+			'returns': returns,
+			'mean': float(np.mean(returns)),
+			'std': float(np.std(returns))
+		}
+		new.append(name)
+	with open(path + '.tmp', 'w') as resultsFile:
+		json.dump({'grid': grid, 'results': results}, resultsFile)
+	os.replace(path + '.tmp', path)
+	return results, new
+
+
+def _evaluateCheckpoint(checkpoint, episodes, activation):
+	environments = _worker['environments']
+	space = environments[0].action_space
+	archive = io.BytesIO()
+	export(readActor(checkpoint), space.high, space.low, 'float32', archive, activation)
+	archive.seek(0)
+	actor = QuantizedActor(archive, len(environments))
+	returns = []
+	for start in range(0, len(episodes), len(environments)):
+		seeds = episodes[start:start + len(environments)]
+		group = environments[:len(seeds)]
+		states = np.array([_reset(env, seed) for env, seed in zip(group, seeds)])
+		cumRewards = np.zeros(len(group))
+		done = np.zeros(len(group), bool)
+		while not done.all():
+			active = np.flatnonzero(~done)
+			actions = actor(states[active])
+			for i, action in zip(active, actions):
+				states[i], reward, done[i], _ = group[i].step(action)
+				cumRewards[i] += reward
+		returns.extend(cumRewards.tolist())
+	return returns
+
+
+def _reset(environment, seed):
+	# Tasks draw their targets and poses from any of these generators, seeded
+	# right before the reset so episodes do not depend on the batch size
+	np.random.seed(seed)
+	if hasattr(environment, 'seed'):
+		environment.seed(seed)
+	if hasattr(environment.observation_space, 'seed'):
+		environment.observation_space.seed(seed)
+	prng = getattr(gym.spaces, 'prng', None)
+	if prng is not None:
+		prng.seed(seed)
+	return environment.reset()
+
+
+def _startWorker(task, batch, slots):
+	environments = []
+	for _ in range(batch):
+		settings = json.loads(json.dumps(task))
+		if 'ports' in settings.get('simulation', {}):
+			settings['simulation']['ports'] = [slots.get()]
+		environments.append(envs.make(settings))
+	_worker['environments'] = environments
@@ -0,0 +1,155 @@
+"""
+Cache of built controller graphs.
+
+A graph is stored as a MetaGraph (`<key>.meta`) together with a JSON file
+(`<key>.json`) that maps the attributes of the controller to the names of the
+graph elements they refer to. The key is a hash of everything that changes
+the structure of the graph: the settings listed in `GRAPH_SETTINGS`, the
+dimensions and bounds of the spaces, and the source of the modules that build
+the graph. Hyperparameters are variables, so they do not take part in the key.
+"""
+
+import hashlib
+import json
+import os
+import types
+
+import numpy as np
+import tensorflow as tf
+
+from olc.settings import getValue
+
+# Modules whose code builds the graph
+GRAPH_SOURCES = ['controller.py', 'graph_cache.py', 'memory.py', 'neural_network.py', 'replay_buffer.py']
+# Settings that are part of the structure of the graph
+GRAPH_SETTINGS = [
+	'actor/activation',
+	'actor/batch-normalization',
+	'actor/layers',
+	'batch-size',
+	'change-detector/name',
+	'critic/action-layer',
+	'critic/activation',
+	'critic/batch-normalization',
+	'critic/layers',
+	'hindsight-ratio',
+	'memory-budget',
+	'metric-decay',
+	'replay-buffer-dtype',
+	'replay-buffer-max',
+	'replay-buffer-min'
+]
+
+
+def cacheKey(settings, stateDim, boundHigh, boundLow):
+	"""
+	Compute the key of the graph of a controller.
+
+	Parameters
+	----------
+	settings : dict
+		Complete settings object.
+	stateDim : int
+		Dimension of the state.
+	boundHigh, boundLow : numpy.ndarray
+		Bounds of the action space.
+
+	Returns
+	-------
+	key : str
+		Hexadecimal digest identifying the graph.
+	"""
+	description = {name: getValue(settings, name) for name in GRAPH_SETTINGS}
+	description['action-repeat'] = settings['task'].get('action-repeat', 1)
+	description['state-dim'] = int(stateDim)
+	description['bound-high'] = np.asarray(boundHigh, float).tolist()
+	description['bound-low'] = np.asarray(boundLow, float).tolist()
+	description['tensorflow'] = tf.__version__
+	digest = hashlib.sha256(json.dumps(description, sort_keys=True).encode())
+	for name in GRAPH_SOURCES:
+		with open(os.path.join(os.path.dirname(__file__), name), 'rb') as source:
+			digest.update(source.read())
+	return digest.hexdigest()[:16]
+
+
+def save(path, handles, extra):
+	"""
+	Store the default graph and the given handles.
+
+	Parameters
+	----------
+	path : str
+		Path of the cache entry, without extension.
+	handles : dict
+		Graph elements by attribute name. Values can be tensors, operations,
+		variables, or lists, dictionaries and namespaces of them.
+	extra : dict
+		Additional JSON values to store with the graph.
+	"""
+	os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+	tf.train.export_meta_graph(path + '.meta.tmp', clear_devices=True)
+	with open(path + '.json.tmp', 'w') as handlesFile:
+		json.dump({'handles': _encode(handles), 'extra': extra}, handlesFile)
+	os.replace(path + '.json.tmp', path + '.json')
+	os.replace(path + '.meta.tmp', path + '.meta')
+
+
+def load(path):
+	"""
+	Import a cached graph into the default graph.
+
+	Parameters
+	----------
+	path : str
+		Path of the cache entry, without extension.
+
+	Returns
+	-------
+	handles : dict
+		Graph elements by attribute name, as given to `save`.
+	extra : dict
+		Additional values stored with the graph.
+	"""
+	tf.train.import_meta_graph(path + '.meta', clear_devices=True)
+	with open(path + '.json', 'r') as handlesFile:
+		stored = json.load(handlesFile)
+	graph = tf.get_default_graph()
+	variables = {v.op.name: v for v in tf.global_variables() + tf.local_variables()}
+	return _decode(stored['handles'], graph, variables), stored['extra']
+
+
+def exists(path):
+	return os.path.exists(path + '.meta') and os.path.exists(path + '.json')
+
+
+def _decode(spec, graph, variables):
+	kind = spec['type']
+	if kind == 'variable':
+		return variables[spec['name']]
+	if kind == 'tensor':
+		return graph.get_tensor_by_name(spec['name'])
+	if kind == 'operation':
+		return graph.get_operation_by_name(spec['name'])
+	if kind == 'list':
+		return [_decode(x, graph, variables) for x in spec['items']]
+	if kind == 'dict':
+		return {k: _decode(v, graph, variables) for k, v in spec['items'].items()}
+	if kind == 'namespace':
+		return types.SimpleNamespace(**{k: _decode(v, graph, variables) for k, v in spec['items'].items()})
+	raise ValueError('Unknown graph element type "{}"'.format(kind))
+
+
+def _encode(value):
+	if isinstance(value, tf.Variable):
+		return {'type': 'variable', 'name': value.op.name}
+	if isinstance(value, tf.Tensor):
+		return {'type': 'tensor', 'name': value.name}
+	if isinstance(value, tf.Operation):
+		return {'type': 'operation', 'name': value.name}
+	if isinstance(value, (list, tuple)):
+		return {'type': 'list', 'items': [_encode(x) for x in value]}
+	if isinstance(value, dict):
+		return {'type': 'dict', 'items': {k: _encode(v) for k, v in value.items()}}
+	if isinstance(value, types.SimpleNamespace):
+		return {'type': 'namespace', 'items': {k: _encode(v) for k, v in vars(value).items()}}
+	raise TypeError('Cannot store {} in the graph cache'.format(type(value).__name__))
@@ -0,0 +1,186 @@
+"""
+Library of trained policies, keyed by task.
+
+A library is a directory with an index (`index.json`) and one NumPy archive
+per entry, holding the actor and critic variables of a checkpoint. Entries
+record the task, the state and action dimensions, a hash of the network
+settings and the shape of every variable. A new run can initialize its
+networks from the closest compatible entry: variables with the same name and
+shape are copied and the others keep their random initialization, so a task
+with another state dimension only has the first layers reinitialized.
+
+Entries are ranked by, in order: same task, same task family (the name
+without its variant and version, `Reacher3` for `Reacher3length-v0`), same
+dimensions, number of parameters that can be copied, same network settings
+and score.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from olc.settings import getValue
+
+INDEX_NAME = 'index.json'
+# Scopes of the variables stored in the library
+NETWORK_SCOPES = ['actor', 'critic']
+# Settings that change the shapes or meaning of the network variables
+NETWORK_SETTINGS = [
+	'actor/activation',
+	'actor/batch-normalization',
+	'actor/layers',
+	'critic/action-layer',
+	'critic/activation',
+	'critic/batch-normalization',
+	'critic/layers'
+]
+
+
+def add(directory, checkpoint, settings, stateDim, actionDim, score=None):
+	"""
+	Add the networks of a checkpoint to a library.
+
+	Adding the same checkpoint again replaces its entry.
+
+	Parameters
+	----------
+	directory : str
+		Library directory, created if needed.
+	checkpoint : str
+		Path to the checkpoint file.
+	settings : dict
+		Complete settings object of the run that wrote the checkpoint.
+	stateDim, actionDim : int
+		Dimensions of the task.
+	score : float, optional
+		Test score of the checkpoint.
+
+	Returns
+	-------
+	entry : dict
+		Index entry of the checkpoint.
+	"""
+	reader = tf.train.load_checkpoint(checkpoint)
+	arrays = {n: reader.get_tensor(n) for n in reader.get_variable_to_shape_map() if isNetwork(n)}
+	task = settings['task']['name']
+	entryId = hashlib.sha256(os.path.abspath(checkpoint).encode()).hexdigest()[:12]
+	os.makedirs(directory, exist_ok=True)
+	np.savez(os.path.join(directory, entryId + '.npz'), **arrays)
+	entry = {
+		'id': entryId,
+		'task': task,
+		'family': family(task),
+		'state-dim': int(stateDim),
+		'action-dim': int(actionDim),
+		'network': networkKey(settings),
+		'shapes': {n: list(a.shape) for n, a in arrays.items()},
+		'score': score,
+		'checkpoint': checkpoint,
+		'added': time.time()
+	}
+	index = [e for e in entries(directory) if e['id'] != entryId] + [entry]
+	path = os.path.join(directory, INDEX_NAME)
+	with open(path + '.tmp', 'w') as indexFile:
+		json.dump(index, indexFile)
+	os.replace(path + '.tmp', path)
+	return entry
+
+
+def closest(directory, task, stateDim, actionDim, shapes, network):
+	"""
+	Find the entry of a library closest to a new run.
+
+	Parameters
+	----------
+	directory : str
+		Library directory.
+	task : str
+		Name of the task of the run.
+	stateDim, actionDim : int
+		Dimensions of the task.
+	shapes : dict
+		Shapes of the network variables of the run, by name.
+	network : str
+		Key of the network settings of the run, see `networkKey`.
+
+	Returns
+	-------
+	entry : dict or None
+		Best entry with at least one variable that can be copied, or None.
+	"""
+	def rank(entry):
+		return (
+			entry['task'] == task,
+			entry['family'] == family(task),
+			entry['state-dim'] == stateDim and entry['action-dim'] == actionDim,
+			transferable(entry, shapes),
+			entry['network'] == network,
+			entry['score'] if entry['score'] is not None else -np.inf
+		)
+	candidates = [e for e in entries(directory) if transferable(e, shapes) > 0]
+	return max(candidates, key=rank) if candidates else None
+
+
+def entries(directory):
+	try:
+		with open(os.path.join(directory, INDEX_NAME), 'r') as indexFile:
+			return json.load(indexFile)
+	except OSError:
+		return []
+
+
+def family(task):
+	"""
+	Remove the variant and version from a task name.
+
+	Parameters
+	----------
+	task : str
+		Task name, such as `Reacher3length-v0`.
+
+	Returns
+	-------
+	family : str
+		Leading letters and digits of the name, such as `Reacher3`.
+	"""
+	name = re.sub(r'-v\d+$', '', task)
+	match = re.match(r'\D+\d+', name)
+	return match.group(0) if match else name
+
+
+def isNetwork(name):
+	return name.split('/')[0] in NETWORK_SCOPES and '/Adam' not in name
+
+
+def load(directory, entry):
+	with np.load(os.path.join(directory, entry['id'] + '.npz')) as archive:
+		return {n: archive[n] for n in archive.files}
+
+
+def networkKey(settings):
+	description = {name: getValue(settings, name) for name in NETWORK_SETTINGS}
+	return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def transferable(entry, shapes):
+	"""
+	Count the parameters of an entry that can be copied to a run.
+
+	Parameters
+	----------
+	entry : dict
+		Index entry.
+	shapes : dict
+		Shapes of the network variables of the run, by name.
+
+	Returns
+	-------
+	n : int
+		Number of scalars in the variables with the same name and shape.
+	"""
+	return int(sum(np.prod(shape) for name, shape in entry['shapes'].items() if name in shapes and list(shapes[name]) == shape))
@@ -1,22 +1,61 @@
+"""
+Logging of events and checkpoints.
+
+When logging settings are given and `rotate` is set, events are written to a sequence of files
+instead of a single one. A new file is started when the current one reaches
+`max-file-bytes` or is older than `max-file-age` seconds. The newest
+`recent-files` files keep every event; older ones are compacted by averaging
+scalars over windows of `downsample` consecutive steps. While the directory
+takes more than `max-total-bytes`, the oldest file is compacted again, up to
+`max-level` times, and then deleted. Compacted files keep the name of the
+original with a `.compacted-<level>` suffix, so TensorBoard still reads them
+in chronological order.
+
+Checkpoints are written to `checkpoints/<name>`, where the newest
+`keep-checkpoints` are kept (all of them if it is 0).
+"""
+
+import glob
+import os
+import re
+import threading
+import time
+
+import numpy as np
 import tensorflow as tf
 
 
 class Logger:
 
-	def __init__(self, name):
-		self.writer = tf.summary.FileWriter('logs/' + name)
+	def __init__(self, name, lock=None, settings=None):
+		self.logDir = 'logs/' + name
+		self.settings = settings if settings is not None and settings['rotate'] else None
+		self.keep = settings.get('keep-checkpoints', 1) if settings is not None else 1
+		self.rotations = 0
+		self.writer = self._openWriter()
 		self.saver = None
 		self.savePath = 'checkpoints/' + name + '/step'
+		self.lock = lock if lock is not None else threading.Lock()
+		self.opened = time.time()
+		self.written = 0
+		self.compactor = None
 
 	def checkpoint(self, session, step):
 		if self.saver is None:
-			self.saver = tf.train.Saver(max_to_keep=1)
-		self.saver.save(session, self.savePath, global_step=step)
+			self.saver = tf.train.Saver(max_to_keep=self.keep)
+		with self.lock:
+			self.saver.save(session, self.savePath, global_step=step)
+
+	def close(self):
+		self.writer.close()
+		if self.compactor is not None:
+			self.compactor.join()
 
 	def loadCheckpoint(self, session, path):
 		if self.saver is None:
-			self.saver = tf.train.Saver(max_to_keep=1)
-		self.saver.restore(session, path)
+			self.saver = tf.train.Saver(max_to_keep=self.keep)
+		with self.lock:
+			self.saver.restore(session, path)
 
 	def logGraph(self):
 		self.writer.add_graph(tf.get_default_graph())
@@ -25,6 +64,150 @@ class Logger:
 	def logScalar(self, name, value, step):
 		summary = tf.Summary(value=[tf.Summary.Value(tag=name, simple_value=value)])
 		self.writer.add_summary(summary, step)
+		self._written()
 
 	def writeSummary(self, summary, step):
 		self.writer.add_summary(summary, step)
+		self._written()
+
+	def _openWriter(self):
+		return tf.summary.FileWriter(self.logDir, filename_suffix='.{:05}'.format(self.rotations))
+
+	def _rotate(self):
+		self.writer.close()
+		self.rotations += 1
+		self.writer = self._openWriter()
+		self.opened = time.time()
+		# Compact in the background, one pass at a time
+		if self.compactor is not None:
+			self.compactor.join()
+		self.compactor = threading.Thread(target=retain, args=(self.logDir, self.settings), daemon=True)
+		self.compactor.start()
+
+	def _written(self):
+		if self.settings is None:
+			return
+		self.written += 1
+		if self.written % self.settings['check-interval'] != 0:
+			return
+		files = eventFiles(self.logDir)
+		if not files:
+			return
+		current = files[-1]
+		if os.path.getsize(current) >= self.settings['max-file-bytes'] or time.time() - self.opened >= self.settings['max-file-age']:
+			self._rotate()
+
+
+def eventFiles(directory):
+	"""
+	List the event files of a directory, from oldest to newest.
+
+	Parameters
+	----------
+	directory : str
+		Directory to search.
+
+	Returns
+	-------
+	files : list of str
+		Paths of the event files, compacted or not.
+	"""
+	files = glob.glob(os.path.join(directory, 'events.out.tfevents.*'))
+	return sorted(f for f in files if not f.endswith('.tmp'))
+
+
+def compact(path, factor):
+	"""
+	Downsample an event file.
+
+	Scalars are averaged over windows of `factor` consecutive events of the same
+	tag, and the average is written at the last step of the window. Other
+	summary values are kept once every `factor` events. Events without
+	summaries (file version, graph) are kept as they are.
+
+	Parameters
+	----------
+	path : str
+		Event file to compact. It is replaced by the compacted file.
+	factor : int
+		Number of events of every tag combined into one.
+
+	Returns
+	-------
+	path : str
+		Path of the compacted file.
+	"""
+	level = _level(path)
+	base = path.rsplit('.compacted-', 1)[0]
+	newPath = '{}.compacted-{}'.format(base, level + 1)
+	windows = {}
+	counts = {}
+	last = {}
+	with tf.io.TFRecordWriter(newPath + '.tmp') as writer:
+		for event in tf.train.summary_iterator(path):
+			if not event.HasField('summary'):
+				writer.write(event.SerializeToString())
+				continue
+			kept = []
+			for value in event.summary.value:
+				if value.HasField('simple_value'):
+					window = windows.setdefault(value.tag, [])
+					window.append(value.simple_value)
+					last[value.tag] = event
+					if len(window) == factor:
+						kept.append(tf.Summary.Value(tag=value.tag, simple_value=np.mean(window)))
+						window.clear()
+				else:
+					counts[value.tag] = counts.get(value.tag, 0) + 1
+					if counts[value.tag] % factor == 0:
+						kept.append(value)
+			if kept:
+				writer.write(_event(event, kept))
+		# Incomplete windows at the end of the file
+		for tag, window in windows.items():
+			if window:
+				writer.write(_event(last[tag], [tf.Summary.Value(tag=tag, simple_value=np.mean(window))]))
+	os.replace(newPath + '.tmp', newPath)
+	os.remove(path)
+	return newPath
+
+
+def retain(directory, settings):
+	"""
+	Apply the retention policy to the event files of a directory.
+
+	The newest file is assumed to be in use and is never modified.
+
+	Parameters
+	----------
+	directory : str
+		Directory of the event files.
+	settings : dict
+		Logging settings.
+	"""
+	files = eventFiles(directory)[:-1]
+	older = files[:max(0, len(files) - settings['recent-files'] + 1)]
+	for path in older:
+		if _level(path) == 0:
+			compact(path, settings['downsample'])
+	files = eventFiles(directory)[:-1]
+	total = sum(os.path.getsize(f) for f in eventFiles(directory))
+	while total > settings['max-total-bytes'] and files:
+		# The oldest file is compacted further or, at the last level, deleted
+		path = files.pop(0)
+		total -= os.path.getsize(path)
+		if _level(path) < settings['max-level']:
+			newPath = compact(path, settings['downsample'])
+			total += os.path.getsize(newPath)
+			files.insert(0, newPath)
+		else:
+			os.remove(path)
+
+
+def _event(template, values):
+	return tf.Event(wall_time=template.wall_time, step=template.step, summary=tf.Summary(value=values)).SerializeToString()
+
+
+def _level(path):
+	match = re.search(r'\.compacted-(\d+)$', path)
+	return int(match.group(1)) if match else 0
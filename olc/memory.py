@@ -0,0 +1,110 @@
+"""
+Accounting of the memory held by a controller.
+
+Sizes are computed from the shapes and types of the arrays and graph
+variables, so they count the memory that is requested, not what the operating
+system actually reports for the process.
+
+Routines
+--------
+fitBuffer
+	Choose the capacity and precision of a replay buffer from a budget.
+variableBytes
+	Bytes held by a list of graph variables.
+"""
+
+import numpy as np
+
+# Candidate storage precisions, from most to least precise
+PRECISIONS = ['float64', 'float32', 'float16']
+
+
+def variableBytes(variables):
+	"""
+	Count the bytes held by a list of graph variables.
+
+	Parameters
+	----------
+	variables : list of tf.Variable
+		Variables to count.
+
+	Returns
+	-------
+	nbytes : int
+		Total size of the variables.
+	"""
+	return sum(v.dtype.size * v.shape.num_elements() for v in variables)
+
+
+def transitionBytes(stateDim, actionDim, dtype, goalDim=0):
+	"""
+	Count the bytes needed to store one transition in a replay buffer.
+
+	This includes the NumPy storage, with the given precision, and its float32
+	mirror in the graph. With goals, it also includes the achieved goals and
+	the episode bookkeeping of relabeling, which are not mirrored.
+
+	Parameters
+	----------
+	stateDim, actionDim : int
+		Dimensions of the state and action.
+	dtype : str
+		Precision of the NumPy storage.
+	goalDim : int, optional
+		Dimension of the goals, 0 without relabeling.
+
+	Returns
+	-------
+	nbytes : int
+		Size of one transition.
+	"""
+	values = 2 * stateDim + actionDim + 1
+	nbytes = values * np.dtype(dtype).itemsize + values * 4 + 2
+	if goalDim:
+		nbytes += 2 * goalDim * np.dtype(dtype).itemsize + 2 * np.dtype(np.int64).itemsize
+	return nbytes
+
+
+def fitBuffer(budget, fixed, stateDim, actionDim, maxCapacity, minCapacity, goalDim=0):
+	"""
+	Choose the capacity and precision of a replay buffer from a memory budget.
+
+	The most precise storage that fits `maxCapacity` transitions is chosen. If
+	none does, the buffer is shrunk to what fits with float32 storage (or
+	float16 if float32 cannot hold `minCapacity` transitions).
+
+	Parameters
+	----------
+	budget : int
+		Total memory available to the controller, in bytes.
+	fixed : int
+		Memory already used by everything except the replay buffer.
+	stateDim, actionDim : int
+		Dimensions of the state and action.
+	maxCapacity, minCapacity : int
+		Largest and smallest acceptable number of transitions.
+	goalDim : int, optional
+		Dimension of the goals, 0 without relabeling.
+
+	Returns
+	-------
+	capacity : int
+		Number of transitions to allocate.
+	dtype : str
+		Storage precision.
+
+	Raises
+	------
+	MemoryError
+		If not even `minCapacity` transitions fit in the budget.
+	"""
+	available = budget - fixed
+	for dtype in PRECISIONS:
+		if available // transitionBytes(stateDim, actionDim, dtype, goalDim) >= maxCapacity:
+			return maxCapacity, dtype
+	for dtype in PRECISIONS[1:]:
+		capacity = available // transitionBytes(stateDim, actionDim, dtype, goalDim)
+		if capacity >= minCapacity:
+			return int(capacity), dtype
+	raise MemoryError('Memory budget of {:.1f} MiB cannot fit {} transitions ({:.1f} MiB used by the networks)'.format(
+		budget / 2 ** 20, minCapacity, fixed / 2 ** 20))
@@ -10,49 +10,23 @@ class Actor:
 			self.output = state
 			if specs['batch-normalization']:
 				self.output = tf.keras.layers.BatchNormalization()(self.output, training=isTraining)
-			with tf.variable_scope('layer_1'):
-				fanIn = self.output.shape[-1].value
-				if specs['batch-normalization']:
-					self.output = tf.keras.layers.Dense(400,
-						kernel_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn)),
-						use_bias=False
-					)(self.output)
-					self.output = tf.keras.layers.BatchNormalization()(self.output, training=isTraining)
-				else:
-					self.output = tf.keras.layers.Dense(400,
-						bias_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn)),
-						kernel_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn))
-					)(self.output)
-				self.output = tf.keras.layers.Activation('relu')(self.output)
-			with tf.variable_scope('layer_2'):
-				fanIn = self.output.shape[-1].value
-				if specs['batch-normalization']:
-					self.output = tf.keras.layers.Dense(300,
-						kernel_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn)),
-						use_bias=False
-					)(self.output)
-					self.output = tf.keras.layers.BatchNormalization()(self.output, training=isTraining)
-				else:
-					self.output = tf.keras.layers.Dense(300,
-						bias_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn)),
-						kernel_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn))
-					)(self.output)
-				self.output = tf.keras.layers.Activation('relu')(self.output)
-			with tf.variable_scope('layer_3'):
-				self.output = tf.keras.layers.Dense(boundHigh.size,
-					bias_initializer=tf.initializers.random_uniform(-3e-3, 3e-3),
-					kernel_initializer=tf.initializers.random_uniform(-3e-3, 3e-3)
-				)(self.output)
+			for i, units in enumerate(specs['layers']):
+				with tf.variable_scope('layer_{}'.format(i + 1)):
+					self.output = hiddenLayer(self.output, units, specs['activation'], specs['batch-normalization'], isTraining)
+			with tf.variable_scope('layer_{}'.format(len(specs['layers']) + 1)):
+				self.output = outputLayer(self.output, boundHigh.size)
 				self.output = tf.keras.layers.Activation('tanh')(self.output)
 			self.output = tf.multiply(self.output, (boundHigh - boundLow) / 2.0)
 			self.output = tf.add(self.output, (boundHigh + boundLow) / 2.0)
 		self.parameters = tf.trainable_variables(scope=name)
 
-	def createTrainOps(self, actionGrad, batchSize):
+	def createTrainOps(self, actionGrad, batchSize, learningRate=None):
+		if learningRate is None:
+			learningRate = self.settings['learning-rate']
 		with tf.variable_scope('train_actor'):
 			self.gradient = tf.gradients(self.output, self.parameters, -actionGrad[0])
 			self.gradient = [x / batchSize for x in self.gradient]
-			optimizer = tf.train.AdamOptimizer(self.settings['learning-rate'])
+			optimizer = tf.train.AdamOptimizer(learningRate)
 			self.train = optimizer.apply_gradients(zip(self.gradient, self.parameters))
 
 	def createUpdateOps(self, tau, actorParams):
@@ -65,49 +39,35 @@ class Actor:
 class Critic:
 
 	def __init__(self, name, specs, action, state, isTraining):
+		_checkActionLayer(specs)
 		self.settings = specs
 		with tf.variable_scope(name):
 			self.output = state
 			if specs['batch-normalization']:
 				self.output = tf.keras.layers.BatchNormalization()(self.output, training=isTraining)
-			with tf.variable_scope('layer_1'):
-				fanIn = self.output.shape[-1].value
-				if specs['batch-normalization']:
-					self.output = tf.keras.layers.Dense(400,
-						kernel_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn)),
-						use_bias=False
-					)(self.output)
-					self.output = tf.keras.layers.BatchNormalization()(self.output, training=isTraining)
-				else:
-					self.output = tf.keras.layers.Dense(400,
-						bias_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn)),
-						kernel_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn))
-					)(self.output)
-				self.output = tf.keras.layers.Activation('relu')(self.output)
-			with tf.variable_scope('layer_2'):
-				fanIn = self.output.shape[-1].value
-				a = tf.keras.layers.Dense(300,
-					bias_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn)),
-					kernel_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn))
-				)(self.output)
-				b = tf.keras.layers.Dense(300,
-					bias_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn)),
-					kernel_initializer=tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn))
-				)(action)
-				self.output = tf.keras.layers.Activation('relu')(a + b)
-			with tf.variable_scope('layer_3'):
-				self.output = tf.keras.layers.Dense(1,
-					bias_initializer=tf.initializers.random_uniform(-3e-3, 3e-3),
-					kernel_initializer=tf.initializers.random_uniform(-3e-3, 3e-3)
-				)(self.output)
+			for i, units in enumerate(specs['layers']):
+				with tf.variable_scope('layer_{}'.format(i + 1)):
+					if i + 1 == specs['action-layer']:
+						# The action enters the network here, without batch normalization
+						a = _dense(self.output, units)
+						b = _dense(action, units, fanIn=self.output.shape[-1].value)
+						self.output = tf.keras.layers.Activation(specs['activation'])(a + b)
+					else:
+						self.output = hiddenLayer(self.output, units, specs['activation'], specs['batch-normalization'], isTraining)
+			with tf.variable_scope('layer_{}'.format(len(specs['layers']) + 1)):
+				self.output = outputLayer(self.output, 1)
 		self.parameters = tf.trainable_variables(scope=name)
 
-	def createTrainOps(self, action, labels):
+	def createTrainOps(self, action, labels, learningRate=None, l2Weight=None):
+		if learningRate is None:
+			learningRate = self.settings['learning-rate']
+		if l2Weight is None:
+			l2Weight = self.settings['lambda']
 		self.actionGrads = tf.gradients(self.output, action, name='action_gradients')
 		with tf.variable_scope('train_critic'):
 			self.loss = tf.losses.mean_squared_error(labels, self.output)
-			self.loss += sum([tf.nn.l2_loss(x) for x in self.parameters]) * self.settings['lambda']
-			optimizer = tf.train.AdamOptimizer(self.settings['learning-rate'])
+			self.loss += sum([tf.nn.l2_loss(x) for x in self.parameters]) * l2Weight
+			optimizer = tf.train.AdamOptimizer(learningRate)
 			self.train = optimizer.minimize(self.loss)
 
 	def createUpdateOps(self, tau, criticParams):
@@ -115,3 +75,140 @@ class Critic:
 			self.update = []
 			for old, new in zip(self.parameters, criticParams):
 				self.update.append(tf.assign(old, new * tau + old * (1 - tau)))
+
+
+class StackedActor(Actor):
+
+	def __init__(self, name, specs, n, state, boundHigh, boundLow):
+		if specs['batch-normalization']:
+			raise ValueError('Stacked networks do not support batch normalization')
+		self.settings = specs
+		with tf.variable_scope(name):
+			self.output = state
+			for i, units in enumerate(specs['layers']):
+				with tf.variable_scope('layer_{}'.format(i + 1)):
+					self.output = tf.keras.layers.Activation(specs['activation'])(_stackedDense(self.output, n, units))
+			with tf.variable_scope('layer_{}'.format(len(specs['layers']) + 1)):
+				self.output = _stackedDense(self.output, n, boundHigh.size, limit=3e-3)
+				self.output = tf.keras.layers.Activation('tanh')(self.output)
+			self.output = tf.multiply(self.output, (boundHigh - boundLow) / 2.0)
+			self.output = tf.add(self.output, (boundHigh + boundLow) / 2.0)
+		self.parameters = tf.trainable_variables(scope=name)
+
+
+class StackedCritic(Critic):
+
+	def __init__(self, name, specs, n, action, state):
+		if specs['batch-normalization']:
+			raise ValueError('Stacked networks do not support batch normalization')
+		_checkActionLayer(specs)
+		self.settings = specs
+		with tf.variable_scope(name):
+			self.output = state
+			for i, units in enumerate(specs['layers']):
+				with tf.variable_scope('layer_{}'.format(i + 1)):
+					if i + 1 == specs['action-layer']:
+						a = _stackedDense(self.output, n, units)
+						b = _stackedDense(action, n, units, fanIn=self.output.shape[-1].value)
+						self.output = tf.keras.layers.Activation(specs['activation'])(a + b)
+					else:
+						self.output = tf.keras.layers.Activation(specs['activation'])(_stackedDense(self.output, n, units))
+			with tf.variable_scope('layer_{}'.format(len(specs['layers']) + 1)):
+				self.output = _stackedDense(self.output, n, 1, limit=3e-3)
+		self.parameters = tf.trainable_variables(scope=name)
+
+	def createTrainOps(self, action, labels, learningRate=None, l2Weight=None):
+		if learningRate is None:
+			learningRate = self.settings['learning-rate']
+		if l2Weight is None:
+			l2Weight = self.settings['lambda']
+		self.actionGrads = tf.gradients(self.output, action, name='action_gradients')
+		with tf.variable_scope('train_critic'):
+			# Summing the losses of the agents keeps their gradients independent
+			self.losses = tf.reduce_mean(tf.squared_difference(labels, self.output), axis=[1, 2])
+			self.loss = tf.reduce_sum(self.losses) + sum([tf.nn.l2_loss(x) for x in self.parameters]) * l2Weight
+			optimizer = tf.train.AdamOptimizer(learningRate)
+			self.train = optimizer.minimize(self.loss)
+
+
+def hiddenLayer(inputs, units, activation, batchNormalization, isTraining):
+	"""
+	Create a fully connected hidden layer.
+
+	Weights are initialized uniformly in [-1 / sqrt(f), 1 / sqrt(f)], where f is
+	the number of inputs of the layer.
+
+	Parameters
+	----------
+	inputs : tf.Tensor
+		Input of the layer.
+	units : int
+		Number of units of the layer.
+	activation : str
+		Name of the activation function.
+	batchNormalization : bool
+		Whether to normalize the output of the layer before the activation.
+	isTraining : tf.Tensor or bool
+		Whether the batch normalization is in training mode.
+
+	Returns
+	-------
+	output : tf.Tensor
+		Output of the layer.
+	"""
+	if batchNormalization:
+		output = _dense(inputs, units, useBias=False)
+		output = tf.keras.layers.BatchNormalization()(output, training=isTraining)
+	else:
+		output = _dense(inputs, units)
+	return tf.keras.layers.Activation(activation)(output)
+
+
+def outputLayer(inputs, units):
+	"""
+	Create a linear output layer with weights initialized in [-3e-3, 3e-3].
+
+	Parameters
+	----------
+	inputs : tf.Tensor
+		Input of the layer.
+	units : int
+		Number of units of the layer.
+
+	Returns
+	-------
+	output : tf.Tensor
+		Output of the layer.
+	"""
+	return tf.keras.layers.Dense(units,
+		bias_initializer=tf.initializers.random_uniform(-3e-3, 3e-3),
+		kernel_initializer=tf.initializers.random_uniform(-3e-3, 3e-3)
+	)(inputs)
+
+
+def _checkActionLayer(specs):
+	# Otherwise the action would never enter the network
+	if not 1 <= specs['action-layer'] <= len(specs['layers']):
+		raise ValueError('critic/action-layer must be between 1 and {}, got {}'.format(len(specs['layers']), specs['action-layer']))
+
+
+def _dense(inputs, units, useBias=True, fanIn=None):
+	if fanIn is None:
+		fanIn = inputs.shape[-1].value
+	initializer = tf.initializers.random_uniform(-1 / np.sqrt(fanIn), 1 / np.sqrt(fanIn))
+	if useBias:
+		return tf.keras.layers.Dense(units, bias_initializer=initializer, kernel_initializer=initializer)(inputs)
+	return tf.keras.layers.Dense(units, kernel_initializer=initializer, use_bias=False)(inputs)
+
+
+def _stackedDense(inputs, n, units, fanIn=None, limit=None):
+	# Inputs are [agents, batch, features], with one kernel per agent
+	if fanIn is None:
+		fanIn = inputs.shape[-1].value
+	if limit is None:
+		limit = 1 / np.sqrt(fanIn)
+	initializer = tf.initializers.random_uniform(-limit, limit)
+	with tf.variable_scope(None, default_name='dense'):
+		kernel = tf.get_variable('kernel', (n, inputs.shape[-1].value, units), initializer=initializer)
+		bias = tf.get_variable('bias', (n, 1, units), initializer=initializer)
+	return tf.matmul(inputs, kernel) + bias
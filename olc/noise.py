@@ -1,36 +1,99 @@
+"""
+Exploration noise processes.
+
+Every process can be batched over several parallel environments by giving the
+number of environments `n`; the values returned by `step` then have shape
+(n, ndim) instead of (ndim,). Random samples are generated in blocks of
+`blockSize` steps, which are refilled in place when exhausted.
+
+Routines
+--------
+make
+	Create the noise process selected in the settings.
+"""
+
 import numpy as np
 
 
 class OrnsteinUhlenbeck:
 
-	def __init__(self, ndim, dt, theta, sigma, mu=0):
+	def __init__(self, ndim, dt, theta, sigma, mu=0, n=None, blockSize=1000, seed=None):
 		self.dt = dt
 		self.theta = theta
 		self.sigma = sigma
 		self.mu = mu
-		self.x = np.zeros(ndim)
+		shape = (ndim,) if n is None else (n, ndim)
+		self.x = np.zeros(shape)
+		self.scratch = np.zeros(shape)
+		self.rng = np.random.default_rng(seed)
+		self.block = np.zeros((blockSize,) + shape)
+		self.index = blockSize
 
-	def reset(self):
-		self.x = np.zeros(self.x.shape)
+	def reset(self, mask=None):
+		if mask is None:
+			self.x[...] = 0
+		else:
+			self.x[mask] = 0
 
 	def step(self):
-		wiener = np.random.normal(0, self.dt, self.x.shape)
-		dx = self.theta * (self.mu - self.x) * self.dt + self.sigma * wiener
-		self.x += dx
+		if self.index == self.block.shape[0]:
+			self.rng.standard_normal(out=self.block)
+			self.block *= self.dt
+			self.index = 0
+		wiener = self.block[self.index]
+		self.index += 1
+		# Drift and diffusion go through the scratch buffer, without temporaries
+		np.subtract(self.mu, self.x, out=self.scratch)
+		self.scratch *= self.theta * self.dt
+		self.x += self.scratch
+		np.multiply(wiener, self.sigma, out=self.scratch)
+		self.x += self.scratch
 		return self.x
 
 
 class Sinusoid:
 
-	def __init__(self, ndim, dt, basePeriod):
+	def __init__(self, ndim, dt, basePeriod, n=None):
 		self.dt = dt
 		t = np.linspace(basePeriod, basePeriod / 2.0, num=ndim)
 		self.f = 2 * np.pi / t
-		self.x = 0.0
+		self.x = np.zeros(() if n is None else (n, 1))
+		self.out = np.zeros(ndim if n is None else (n, ndim))
 
-	def reset(self):
-		self.x = 0.0
+	def reset(self, mask=None):
+		if mask is None:
+			self.x[...] = 0
+		else:
+			self.x[mask] = 0
 
 	def step(self):
 		self.x += self.dt
-		return np.sin(self.x * self.f)
+		np.multiply(self.x, self.f, out=self.out)
+		return np.sin(self.out, out=self.out)
+
+
+def make(settings, ndim, n=None):
+	"""
+	Create the noise process selected in the settings.
+
+	Parameters
+	----------
+	settings : dict
+		Noise settings. The process is selected with the `name` key.
+	ndim : int
+		Dimension of the noise.
+	n : int, optional
+		Number of parallel environments. If not given, the process is not
+		batched.
+
+	Returns
+	-------
+	process : OrnsteinUhlenbeck or Sinusoid
+		New noise process.
+	"""
+	if settings['name'] == 'OrnsteinUhlenbeck':
+		return OrnsteinUhlenbeck(ndim, settings['dt'], settings['theta'], settings['sigma'],
+			n=n, blockSize=settings['block-size'])
+	if settings['name'] == 'Sinusoid':
+		return Sinusoid(ndim, settings['dt'], settings['base-period'], n=n)
+	raise ValueError('Unknown noise process "{}"'.format(settings['name']))
@@ -0,0 +1,148 @@
+"""
+Population based training of controllers.
+
+A population is a group of controllers that train in parallel processes on the
+same task, each one with its own hyperparameters. Every time a member is
+evaluated it compares its score with the rest of the population. Members in
+the bottom quantile copy the weights and replay buffer of a member in the top
+quantile (exploit) and then perturb the hyperparameters they inherited
+(explore).
+"""
+
+import json
+import multiprocessing
+import random
+
+import numpy as np
+import tensorflow as tf
+
+import olc.environments as envs
+from olc.controller import HYPERPARAMETERS, Controller
+from olc.logger import Logger
+from olc.settings import getValue, setValue
+
+
+class Member:
+
+	def __init__(self, settings, index, table, lock):
+		self.settings = settings['population']
+		self.index = index
+		self.table = table
+		self.lock = lock
+
+	def exploit(self, controller, step, score):
+		with self.lock:
+			self.table[self.index] = {
+				'score': score,
+				'step': step,
+				'checkpoints': controller.logger.savePath.rsplit('/', 1)[0],
+				'hyperparameters': controller.getHyperparameters()
+			}
+			ranking = sorted(self.table.keys(), key=lambda k: self.table[k]['score'])
+		cutoff = max(1, int(len(ranking) * self.settings['quantile']))
+		if len(ranking) < 2 or self.index not in ranking[:cutoff]:
+			return
+		source = random.choice(ranking[-cutoff:])
+		with self.lock:
+			hyperparameters = self.table[source]['hyperparameters']
+			path = tf.train.latest_checkpoint(self.table[source]['checkpoints'])
+			controller.logger.loadCheckpoint(controller.session, path)
+		controller.buffer.restore(controller.session)
+		tf.train.get_global_step().load(step, controller.session)
+		controller.setHyperparameters(perturb(hyperparameters, self.settings['perturbation']))
+		print('Member {} copied member {} at step {}'.format(self.index, source, step))
+
+
+def perturb(hyperparameters, factors):
+	"""
+	Randomly scale every hyperparameter by one of the given factors.
+
+	Parameters
+	----------
+	hyperparameters : dict
+		Current values of the hyperparameters.
+	factors : list of float
+		Factors from which to choose.
+
+	Returns
+	-------
+	perturbed : dict
+		New values of the hyperparameters.
+	"""
+	return {name: value * random.choice(factors) for name, value in hyperparameters.items()}
+
+
+def sample(hyperparameters, scale):
+	"""
+	Sample initial hyperparameters around the given values.
+
+	Each value is multiplied by a factor drawn log-uniformly from the interval
+	[1 / scale, scale].
+
+	Parameters
+	----------
+	hyperparameters : dict
+		Base values of the hyperparameters.
+	scale : float
+		Largest factor by which a value can change.
+
+	Returns
+	-------
+	sampled : dict
+		New values of the hyperparameters.
+	"""
+	return {name: value * scale ** np.random.uniform(-1, 1) for name, value in hyperparameters.items()}
+
+
+def train(settings, name):
+	"""
+	Train a population of controllers, each one in its own process.
+
+	Parameters
+	----------
+	settings : dict
+		Complete settings object, including the `population` settings.
+	name : str
+		Name of the experiment. Members are logged under `<name>/member-<i>`.
+
+	Returns
+	-------
+	table : dict
+		Last score, step and hyperparameters reported by every member.
+	"""
+	ports = settings['task'].get('simulation', {}).get('ports')
+	if ports is not None and len(ports) < settings['population']['size']:
+		raise ValueError('A population of {} members needs as many V-REP ports, {} given'.format(settings['population']['size'], len(ports)))
+	context = multiprocessing.get_context('spawn')
+	manager = context.Manager()
+	table = manager.dict()
+	lock = manager.RLock()
+	processes = []
+	for i in range(settings['population']['size']):
+		process = context.Process(target=_runMember, args=(settings, name, i, table, lock))
+		process.start()
+		processes.append(process)
+	for process in processes:
+		process.join()
+	return {k: dict(v) for k, v in table.items()}
+
+
+def _runMember(settings, name, index, table, lock):
+	settings = json.loads(json.dumps(settings))
+	random.seed()
+	np.random.seed()
+	# Members of V-REP tasks each use one of the listed simulator instances
+	simulation = settings['task'].get('simulation', {})
+	if 'ports' in simulation:
+		simulation['ports'] = [simulation['ports'][index]]
+	environment = envs.make(settings['task'])
+	logger = Logger('{}/member-{}'.format(name, index), lock, settings['logging'])
+	if index > 0:
+		base = {path: getValue(settings, path) for path in HYPERPARAMETERS}
+		for path, value in sample(base, settings['population']['initial-scale']).items():
+			setValue(settings, path, value)
+	member = Member(settings, index, table, lock)
+	controller = Controller(settings, environment, logger, None, member)
+	controller.run()
+	environment.close()
+	logger.close()
@@ -0,0 +1,116 @@
+"""
+Cost of actor and critic architectures.
+
+The networks described by a settings object are built in a separate graph,
+alone, so that their cost can be measured without the rest of the controller.
+FLOPs are counted analytically for one sample (a multiply-add counts as two
+operations); memory counts the float32 parameters and the two Adam slots of
+every trainable parameter.
+"""
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from olc.neural_network import Actor, Critic
+
+
+def flops(specs, inputDim, outputDim, actionDim=None):
+	"""
+	Count the floating point operations of one forward pass of a network.
+
+	Parameters
+	----------
+	specs : dict
+		Actor or critic settings.
+	inputDim, outputDim : int
+		Dimensions of the input and output of the network.
+	actionDim : int, optional
+		Dimension of the action, for critics.
+
+	Returns
+	-------
+	flops : int
+		Operations for a single sample, including biases and activations.
+	"""
+	sizes = [inputDim] + list(specs['layers']) + [outputDim]
+	total = 0
+	for i in range(len(sizes) - 1):
+		total += 2 * sizes[i] * sizes[i + 1] + 2 * sizes[i + 1]
+		if actionDim is not None and i + 1 == specs.get('action-layer'):
+			total += 2 * actionDim * sizes[i + 1] + sizes[i + 1]
+	return total
+
+
+def profile(settings, stateDim, boundHigh, boundLow, repeats=1000):
+	"""
+	Measure the cost of the actor and critic described by the settings.
+
+	Parameters
+	----------
+	settings : dict
+		Complete settings object.
+	stateDim : int
+		Dimension of the state.
+	boundHigh, boundLow : numpy.ndarray
+		Bounds of the action space.
+	repeats : int
+		Number of measurements for each timing.
+
+	Returns
+	-------
+	report : dict
+		Actor and critic FLOPs and parameter counts, memory (bytes) and
+		median time (s) of an actor inference for one state and of a training
+		step with a full batch.
+	"""
+	actionDim = boundHigh.size
+	batchSize = settings['batch-size']
+	graph = tf.Graph()
+	with graph.as_default():
+		state = tf.placeholder(tf.float32, (None, stateDim), name='state')
+		action = tf.placeholder(tf.float32, (None, actionDim), name='action')
+		labels = tf.placeholder(tf.float32, (None, 1), name='q_labels')
+		isTraining = tf.placeholder_with_default(True, None, 'is_training')
+		actor = Actor('actor', settings['actor'], state, isTraining, boundHigh, boundLow)
+		critic = Critic('critic', settings['critic'], action, state, isTraining)
+		critic.createTrainOps(action, labels)
+		actor.createTrainOps(critic.actionGrads, batchSize)
+		report = {
+			'actor-flops': flops(settings['actor'], stateDim, actionDim),
+			'critic-flops': flops(settings['critic'], stateDim, 1, actionDim),
+			'actor-parameters': _count(actor.parameters),
+			'critic-parameters': _count(critic.parameters)
+		}
+		report['memory'] = 3 * 4 * (report['actor-parameters'] + report['critic-parameters'])
+		with tf.Session(graph=graph) as session:
+			session.run(tf.global_variables_initializer())
+			infer = session.make_callable(actor.output, [state, isTraining])
+			trainCritic = session.make_callable([critic.train, actor.output], [state, action, labels])
+			trainActor = session.make_callable(actor.train, [state, action])
+			single = np.random.uniform(-1, 1, (1, stateDim))
+			states = np.random.uniform(-1, 1, (batchSize, stateDim))
+			actions = np.random.uniform(boundLow, boundHigh, (batchSize, actionDim))
+			qLabels = np.random.uniform(-1, 1, (batchSize, 1))
+
+			def trainStep():
+				_, predicted = trainCritic(states, actions, qLabels)
+				trainActor(states, predicted)
+			report['inference-time'] = _time(lambda: infer(single, False), repeats)
+			report['training-time'] = _time(trainStep, repeats)
+	return report
+
+
+def _count(variables):
+	return int(sum(np.prod(v.shape.as_list()) for v in variables))
+
+
+def _time(function, repeats):
+	function()
+	times = np.zeros(repeats)
+	for i in range(repeats):
+		start = time.perf_counter()
+		function()
+		times[i] = time.perf_counter() - start
+	return np.median(times)
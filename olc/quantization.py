@@ -0,0 +1,269 @@
+"""
+Reduced precision export of trained actors.
+
+The weights of the actor are read directly from a checkpoint, batch
+normalization layers (if any) are folded into the dense layers and the result
+is stored in a NumPy archive with one of the following precisions:
+
+float32
+	Reference precision, identical to the trained network.
+float16
+	Half precision kernels and biases.
+int8
+	Symmetric per output channel quantization of the kernels, with float32
+	scales and biases.
+
+`QuantizedActor` evaluates an exported actor with NumPy only. NumPy has no
+integer matrix products, so quantized kernels are expanded to float32 once
+when loading: reduced precisions shrink the stored actor but run as fast as
+float32. Inference avoids TensorFlow's per call overhead and reuses its
+intermediate buffers between calls. Exported actors are compared against the
+actions of the trained network itself, computed with TensorFlow by
+`referenceActions`, so errors of the export (such as batch normalization
+folding) are measured too.
+"""
+
+import re
+
+import numpy as np
+import tensorflow as tf
+
+from olc.neural_network import Actor
+
+# Default epsilon of tf.keras.layers.BatchNormalization
+BN_EPSILON = 1e-3
+PRECISIONS = ['float32', 'float16', 'int8']
+# In place versions of the supported activations
+ACTIVATIONS = {
+	'linear': lambda x: x,
+	'relu': lambda x: np.maximum(x, 0, out=x),
+	'elu': lambda x: np.putmask(x, x < 0, np.expm1(np.minimum(x, 0))),
+	'sigmoid': lambda x: np.divide(1, np.add(1, np.exp(np.negative(x, out=x), out=x), out=x), out=x),
+	'tanh': lambda x: np.tanh(x, out=x)
+}
+
+
+def readActor(checkpoint, scope='actor'):
+	"""
+	Read the dense layers of an actor from a checkpoint.
+
+	Parameters
+	----------
+	checkpoint : str
+		Path to the checkpoint file.
+	scope : str
+		Variable scope of the actor.
+
+	Returns
+	-------
+	layers : list of tuple
+		Kernel and bias of every layer, with batch normalization folded in.
+	"""
+	reader = tf.train.load_checkpoint(checkpoint)
+	names = [n for n in reader.get_variable_to_shape_map() if n.startswith(scope + '/')]
+	layers = []
+	i = 1
+	while any(n.startswith('{}/layer_{}/'.format(scope, i)) for n in names):
+		prefix = '{}/layer_{}/'.format(scope, i)
+		variables = _bySuffix(reader, [n for n in names if n.startswith(prefix)])
+		i += 1
+		kernel = variables['kernel']
+		bias = variables.get('bias', np.zeros(kernel.shape[1]))
+		if 'moving_mean' in variables:
+			kernel, bias = _foldOutput(kernel, bias, variables)
+		layers.append((kernel.astype(np.float32), bias.astype(np.float32)))
+	inputNorm = _bySuffix(reader, [n for n in names if re.match(scope + r'/batch_normalization[^/]*/', n)])
+	if inputNorm:
+		scale = inputNorm['gamma'] / np.sqrt(inputNorm['moving_variance'] + BN_EPSILON)
+		shift = inputNorm['beta'] - inputNorm['moving_mean'] * scale
+		kernel, bias = layers[0]
+		layers[0] = ((scale[:, None] * kernel).astype(np.float32), (bias + shift @ kernel).astype(np.float32))
+	return layers
+
+
+def readStates(checkpoint, n):
+	"""
+	Read the most recent states stored in the replay buffer of a checkpoint.
+
+	Parameters
+	----------
+	checkpoint : str
+		Path to the checkpoint file.
+	n : int
+		Maximum number of states to return.
+
+	Returns
+	-------
+	states : numpy.ndarray
+		Array of shape (m, stateDim), with m <= n.
+	"""
+	reader = tf.train.load_checkpoint(checkpoint)
+	states = reader.get_tensor('replay_buffer/s_i')
+	head = int(reader.get_tensor('replay_buffer/head'))
+	size = min(int(reader.get_tensor('replay_buffer/size')), n)
+	idx = (head - np.arange(size) - 1) % states.shape[0]
+	return states[idx].astype(np.float32)
+
+
+def export(layers, boundHigh, boundLow, precision, path, activation='relu'):
+	"""
+	Write an actor to a NumPy archive with the given precision.
+
+	Parameters
+	----------
+	layers : list of tuple
+		Kernel and bias of every layer, as returned by `readActor`.
+	boundHigh, boundLow : numpy.ndarray
+		Bounds of the action space.
+	precision : str
+		One of `PRECISIONS`.
+	path : str
+		Output file.
+	activation : str
+		Activation function of the hidden layers.
+	"""
+	if activation not in ACTIVATIONS:
+		raise ValueError('Unsupported activation "{}"'.format(activation))
+	arrays = {
+		'activation': np.array(activation),
+		'precision': np.array(precision),
+		'high': np.asarray(boundHigh, np.float32),
+		'low': np.asarray(boundLow, np.float32)
+	}
+	for i, (kernel, bias) in enumerate(layers):
+		if precision == 'int8':
+			scale = np.abs(kernel).max(axis=0) / 127.
+			scale[scale == 0] = 1.
+			arrays['kernel_{}'.format(i)] = np.round(kernel / scale).astype(np.int8)
+			arrays['scale_{}'.format(i)] = scale.astype(np.float32)
+			arrays['bias_{}'.format(i)] = bias.astype(np.float32)
+		elif precision in PRECISIONS:
+			arrays['kernel_{}'.format(i)] = kernel.astype(precision)
+			arrays['bias_{}'.format(i)] = bias.astype(precision)
+		else:
+			raise ValueError('Unknown precision "{}"'.format(precision))
+	np.savez(path, **arrays)
+
+
+class QuantizedActor:
+
+	def __init__(self, path, maxBatch=1):
+		archive = np.load(path)
+		self.precision = str(archive['precision'])
+		self.activation = ACTIVATIONS[str(archive['activation'])]
+		self.kernels = []
+		self.biases = []
+		i = 0
+		while 'kernel_{}'.format(i) in archive:
+			kernel = archive['kernel_{}'.format(i)].astype(np.float32)
+			if self.precision == 'int8':
+				kernel *= archive['scale_{}'.format(i)]
+			self.kernels.append(np.ascontiguousarray(kernel))
+			self.biases.append(archive['bias_{}'.format(i)].astype(np.float32))
+			i += 1
+		self.scale = (archive['high'] - archive['low']) / 2.
+		self.offset = (archive['high'] + archive['low']) / 2.
+		self._allocate(maxBatch)
+
+	def __call__(self, states):
+		states = np.asarray(states, np.float32)
+		if states.ndim == 1:
+			return self(states[None, :])[0]
+		n = states.shape[0]
+		if n > self.buffers[0].shape[0]:
+			self._allocate(n)
+		x = states
+		last = len(self.kernels) - 1
+		for i, (kernel, bias) in enumerate(zip(self.kernels, self.biases)):
+			out = self.buffers[i][:n]
+			np.dot(x, kernel, out=out)
+			out += bias
+			if i < last:
+				self.activation(out)
+			else:
+				np.tanh(out, out=out)
+			x = out
+		return x * self.scale + self.offset
+
+	def _allocate(self, n):
+		self.buffers = [np.zeros((n, k.shape[1]), np.float32) for k in self.kernels]
+
+
+def compare(paths, states, reference):
+	"""
+	Compare the size and accuracy of several exported actors.
+
+	Every precision is evaluated with the same float32 kernels, so their speed
+	is not compared.
+
+	Parameters
+	----------
+	paths : list of str
+		Exported actors to compare.
+	states : numpy.ndarray
+		States on which to evaluate the actors.
+	reference : numpy.ndarray
+		Actions of the trained actor for the same states, as returned by
+		`referenceActions`.
+
+	Returns
+	-------
+	report : list of dict
+		Precision, size of the stored weights (bytes) and maximum and mean
+		absolute action error of every actor.
+	"""
+	report = []
+	for path in paths:
+		actor = QuantizedActor(path, len(states))
+		error = np.abs(actor(states) - reference)
+		report.append({
+			'precision': actor.precision,
+			'size': _weightBytes(path),
+			'max-error': error.max(),
+			'mean-error': error.mean()
+		})
+	return report
+
+
+def referenceActions(specs, checkpoint, states, boundHigh, boundLow):
+	"""
+	Compute the actions of the trained actor of a checkpoint with TensorFlow.
+
+	Parameters
+	----------
+	specs : dict
+		Settings of the actor.
+	checkpoint : str
+		Path to the checkpoint file.
+	states : numpy.ndarray
+		States on which to evaluate the actor.
+	boundHigh, boundLow : numpy.ndarray
+		Bounds of the action space.
+
+	Returns
+	-------
+	actions : numpy.ndarray
+		Array of shape (len(states), actionDim).
+	"""
+	graph = tf.Graph()
+	with graph.as_default():
+		state = tf.placeholder(tf.float32, (None, states.shape[1]), name='state')
+		actor = Actor('actor', specs, state, False, boundHigh, boundLow)
+		saver = tf.train.Saver(tf.global_variables(scope='actor'))
+		with tf.Session(graph=graph) as session:
+			saver.restore(session, checkpoint)
+			return session.run(actor.output, {state: states})
+
+
+def _bySuffix(reader, names):
+	return {n.rsplit('/', 1)[-1]: reader.get_tensor(n) for n in names if 'Adam' not in n}
+
+
+def _foldOutput(kernel, bias, norm):
+	scale = norm['gamma'] / np.sqrt(norm['moving_variance'] + BN_EPSILON)
+	return kernel * scale, (bias - norm['moving_mean']) * scale + norm['beta']
+
+
+def _weightBytes(path):
+	with np.load(path) as archive:
+		return sum(archive[n].nbytes for n in archive.files if re.match(r'(kernel|scale|bias)_', n))
@@ -0,0 +1,212 @@
+"""
+Recording of transitions to disk.
+
+A recording is a directory with a `meta.json` file describing the layout and
+a sequence of chunk files (`chunk-00000.bin`, `chunk-00001.bin`, ...). Every
+chunk is a headerless, append-only array of float32 rows with the layout
+
+	initial state | action | reward | final state | terminal
+
+so it can be memory-mapped directly with `numpy.memmap`. Chunks hold at most
+`chunk-size` rows; when one is full, a new one is started.
+"""
+
+import glob
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+from gym.spaces import Box
+
+
+class Recorder:
+
+	def __init__(self, directory, observationSpace, actionSpace, chunkSize, blockSize=1000):
+		self.directory = directory
+		self.stateDim = observationSpace.low.size
+		self.actionDim = actionSpace.low.size
+		self.chunkSize = chunkSize
+		self.width = 2 * self.stateDim + self.actionDim + 2
+		os.makedirs(directory, exist_ok=True)
+		metaPath = os.path.join(directory, 'meta.json')
+		if os.path.exists(metaPath):
+			_checkMeta(directory, self.stateDim, self.actionDim)
+		else:
+			with open(metaPath, 'w') as metaFile:
+				json.dump({
+					'state-dim': self.stateDim,
+					'action-dim': self.actionDim,
+					'state-low': observationSpace.low.tolist(),
+					'state-high': observationSpace.high.tolist(),
+					'action-low': actionSpace.low.tolist(),
+					'action-high': actionSpace.high.tolist(),
+					'dtype': 'float32'
+				}, metaFile)
+		chunks = _chunks(directory)
+		self.chunk = len(chunks)
+		self.rows = 0
+		if chunks:
+			rows = os.path.getsize(chunks[-1]) // (4 * self.width)
+			# Drop a row torn by an interrupted run, which would shift the next ones
+			os.truncate(chunks[-1], rows * 4 * self.width)
+			if rows < chunkSize:
+				self.chunk -= 1
+				self.rows = rows
+		self.block = np.zeros((blockSize, self.width), np.float32)
+		self.pending = 0
+
+	def close(self):
+		self.flush()
+
+	def flush(self):
+		start = 0
+		while start < self.pending:
+			n = min(self.pending - start, self.chunkSize - self.rows)
+			path = os.path.join(self.directory, 'chunk-{:05}.bin'.format(self.chunk))
+			with open(path, 'ab') as chunkFile:
+				self.block[start:start + n].tofile(chunkFile)
+			start += n
+			self.rows += n
+			if self.rows == self.chunkSize:
+				self.chunk += 1
+				self.rows = 0
+		self.pending = 0
+
+	def store(self, si, a, r, sf, t):
+		row = self.block[self.pending]
+		sd, ad = self.stateDim, self.actionDim
+		row[:sd] = si
+		row[sd:sd + ad] = a
+		row[sd + ad] = r
+		row[sd + ad + 1:2 * sd + ad + 1] = sf
+		row[-1] = t
+		self.pending += 1
+		if self.pending == self.block.shape[0]:
+			self.flush()
+
+
+class Prefetcher:
+
+	def __init__(self, directories, stateDim, actionDim, blockSize, depth, epochs=1):
+		self.directories = directories
+		self.stateDim = stateDim
+		self.actionDim = actionDim
+		self.blockSize = blockSize
+		self.epochs = epochs
+		self.queue = queue.Queue(maxsize=depth)
+		self.error = None
+		self.thread = threading.Thread(target=self._work, daemon=True)
+		self.thread.start()
+
+	def __iter__(self):
+		while True:
+			block = self.queue.get()
+			if block is None:
+				break
+			yield block
+		if self.error is not None:
+			raise self.error
+
+	def _work(self):
+		try:
+			for _ in range(self.epochs):
+				for directory in self.directories:
+					for columns in read(directory, self.stateDim, self.actionDim):
+						for start in range(0, len(columns[0]), self.blockSize):
+							# Copying forces the pages to be read in this thread
+							self.queue.put([np.array(c[start:start + self.blockSize]) for c in columns])
+		except Exception as e:
+			self.error = e
+		finally:
+			self.queue.put(None)
+
+
+class Spaces:
+
+	def __init__(self, directory):
+		with open(os.path.join(directory, 'meta.json'), 'r') as metaFile:
+			meta = json.load(metaFile)
+		# Older recordings only have the dimensions, their states are unbounded
+		if 'state-low' in meta:
+			self.observation_space = Box(np.array(meta['state-low']), np.array(meta['state-high']))
+		else:
+			self.observation_space = Box(-np.inf, np.inf, (meta['state-dim'],))
+		if 'action-low' in meta:
+			self.action_space = Box(np.array(meta['action-low']), np.array(meta['action-high']))
+		else:
+			# The actor scales its output to the action bounds, which must be finite
+			actions = [a for _, a, _, _, _ in read(directory, meta['state-dim'], meta['action-dim'])]
+			if not actions:
+				raise ValueError('Recording "{}" has no action bounds and no transitions'.format(directory))
+			self.action_space = Box(np.min([a.min(axis=0) for a in actions], axis=0), np.max([a.max(axis=0) for a in actions], axis=0))
+
+	def close(self):
+		pass
+
+
+def read(directory, stateDim, actionDim):
+	"""
+	Memory-map all the transitions of a recording.
+
+	Parameters
+	----------
+	directory : str
+		Directory of the recording.
+	stateDim, actionDim : int
+		Expected dimensions of the states and actions.
+
+	Yields
+	------
+	si, a, r, sf, t : numpy.ndarray
+		Views of the columns of every chunk, in order.
+	"""
+	_checkMeta(directory, stateDim, actionDim)
+	width = 2 * stateDim + actionDim + 2
+	for path in _chunks(directory):
+		rows = os.path.getsize(path) // (4 * width)
+		if rows == 0:
+			continue
+		data = np.memmap(path, np.float32, 'r', shape=(rows, width))
+		sd, ad = stateDim, actionDim
+		yield data[:, :sd], data[:, sd:sd + ad], data[:, sd + ad], data[:, sd + ad + 1:2 * sd + ad + 1], data[:, -1] != 0
+
+
+def load(directories, buffer):
+	"""
+	Fill a replay buffer with the transitions of one or more recordings.
+
+	Recordings are loaded in the given order, so if they do not fit the buffer
+	the most recent transitions of the last recordings are kept.
+
+	Parameters
+	----------
+	directories : list of str
+		Directories of the recordings.
+	buffer : ReplayBuffer
+		Buffer to fill.
+
+	Returns
+	-------
+	n : int
+		Number of transitions read.
+	"""
+	n = 0
+	for directory in directories:
+		for columns in read(directory, buffer.iState.shape[1], buffer.action.shape[1]):
+			buffer.storeTransitions(*columns)
+			n += len(columns[0])
+	return n
+
+
+def _checkMeta(directory, stateDim, actionDim):
+	with open(os.path.join(directory, 'meta.json'), 'r') as metaFile:
+		meta = json.load(metaFile)
+	if meta['state-dim'] != stateDim or meta['action-dim'] != actionDim:
+		raise ValueError('Recording "{}" has state/action dimensions {}/{}, expected {}/{}'.format(
+			directory, meta['state-dim'], meta['action-dim'], stateDim, actionDim))
+
+
+def _chunks(directory):
+	return sorted(glob.glob(os.path.join(directory, 'chunk-*.bin')))
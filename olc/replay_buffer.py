@@ -1,23 +1,48 @@
-"""Storage for previously seen transitions."""
+"""
+Storage for previously seen transitions.
+
+Transitions are sampled uniformly among the newest `size` ones by default.
+With `setRecency`, the age of every sampled transition instead follows an
+exponential distribution with the given mean, truncated to the stored
+transitions, so newer transitions are sampled more often without older ones
+being dropped. Ages are drawn at once with the inverse of its CDF, and may
+repeat within a batch.
+
+With relabeling enabled, the buffer also keeps the goal achieved before and
+after every transition, its absolute position and the end of its episode.
+Episodes are closed with `endEpisode`. When sampling, a fraction of the
+transitions that belong to an episode get the goal achieved at a random later
+step of the same episode, and the relabeling function of the task rewrites
+their states and rewards for that goal.
+"""
 
 import random
 
 import numpy as np
 import tensorflow as tf
 
+from olc.memory import variableBytes
+
 
 class ReplayBuffer:
 
-	def __init__(self, max_capacity, actionDim, stateDim):
+	def __init__(self, max_capacity, actionDim, stateDim, dtype='float64', variables=None):
 		self.max_capacity = max_capacity
 		self.capacity = max_capacity
 		self.head = 0
 		self.size = 0
-		self.iState = np.zeros((max_capacity, stateDim))
-		self.action = np.zeros((max_capacity, actionDim))
-		self.reward = np.zeros(max_capacity)
-		self.fState = np.zeros((max_capacity, stateDim))
+		self.iState = np.zeros((max_capacity, stateDim), dtype)
+		self.action = np.zeros((max_capacity, actionDim), dtype)
+		self.reward = np.zeros(max_capacity, dtype)
+		self.fState = np.zeros((max_capacity, stateDim), dtype)
 		self.terminal = np.zeros(max_capacity, bool)
+		self.relabel = None
+		self.recency = None
+		if variables is not None:
+			# Graph variables that already exist, for example in a cached graph
+			self.cap, self.h, self.sz = variables.cap, variables.h, variables.sz
+			self.si, self.a, self.r, self.sf, self.t = variables.si, variables.a, variables.r, variables.sf, variables.t
+			return
 		with tf.variable_scope('replay_buffer', initializer=tf.initializers.zeros):
 			self.cap = tf.get_variable('capacity', (), dtype=tf.int32, trainable=False)
 			self.h = tf.get_variable('head', (), dtype=tf.int32, trainable=False)
@@ -28,10 +53,36 @@ class ReplayBuffer:
 			self.sf = tf.get_variable('s_f', (max_capacity, stateDim), dtype=tf.float32, trainable=False)
 			self.t = tf.get_variable('t', (max_capacity,), dtype=tf.bool, trainable=False)
 
+	def endEpisode(self):
+		if self.relabel is None or self.episodeStart == self.stored:
+			return
+		first = max(self.episodeStart, self.stored - self.max_capacity)
+		self.episodeEnd[np.arange(first, self.stored) % self.max_capacity] = self.stored - 1
+		self.episodeStart = self.stored
+
+	def nbytes(self):
+		arrays = [self.iState, self.action, self.reward, self.fState, self.terminal]
+		if self.relabel is not None:
+			arrays += [self.achievedI, self.achievedF, self.position, self.episodeEnd]
+		mirror = [self.si, self.a, self.r, self.sf, self.t]
+		return {
+			'numpy': sum(x.nbytes for x in arrays),
+			'tensorflow': variableBytes(mirror)
+		}
+
 	def restore(self, session):
-		self.capacity, self.head, self.size, self.iState, self.action, self.reward, self.fState, self.terminal = session.run(
+		self.capacity, self.head, self.size, iState, action, reward, fState, terminal = session.run(
 			[self.cap, self.h, self.sz, self.si, self.a, self.r, self.sf, self.t]
 		)
+		# Keep the storage precision of this buffer
+		self.iState[...] = iState
+		self.action[...] = action
+		self.reward[...] = reward
+		self.fState[...] = fState
+		self.terminal[...] = terminal
+		if self.relabel is not None:
+			# The achieved goals of the restored transitions are not saved
+			self._resetEpisodes()
 
 	def save(self, session):
 		self.cap.load(self.capacity, session)
@@ -48,19 +99,104 @@ class ReplayBuffer:
 		if self.size > self.capacity:
 			self.size = self.capacity
 
-	def storeTransition(self, si, a, r, sf, t):
+	def setRecency(self, scale):
+		# Mean age of the sampled transitions, None for uniform sampling
+		self.recency = scale
+
+	def setRelabeling(self, relabel, goalDim, ratio):
+		self.relabel = relabel
+		self.ratio = ratio
+		self.achievedI = np.zeros((self.max_capacity, goalDim), self.iState.dtype)
+		self.achievedF = np.zeros((self.max_capacity, goalDim), self.iState.dtype)
+		# Absolute position of every transition, -1 outside of episodes
+		self.position = np.full(self.max_capacity, -1, np.int64)
+		self.episodeEnd = np.full(self.max_capacity, -1, np.int64)
+		self._resetEpisodes()
+
+	def storeTransition(self, si, a, r, sf, t, achieved=None):
 		self.iState[self.head, :] = si
 		self.action[self.head, :] = a
 		self.reward[self.head] = r
 		self.fState[self.head, :] = sf
 		self.terminal[self.head] = t
+		if self.relabel is not None:
+			self._storeEpisode(np.array([self.head]), achieved)
 		if self.size < self.capacity:
 			self.size += 1
 		self.head = (self.head + 1) % self.max_capacity
 
+	def storeTransitions(self, si, a, r, sf, t, achieved=None):
+		n = len(r)
+		if n > self.max_capacity:
+			si, a, r, sf, t = si[-self.max_capacity:], a[-self.max_capacity:], r[-self.max_capacity:], sf[-self.max_capacity:], t[-self.max_capacity:]
+			if achieved is not None:
+				achieved = tuple(np.reshape(x, (n, -1))[-self.max_capacity:] for x in achieved)
+			if self.relabel is not None:
+				# Skipped rows still count, so the stored count follows the head
+				self.stored += n - self.max_capacity
+			self.head = (self.head + n - self.max_capacity) % self.max_capacity
+			n = self.max_capacity
+		idx = (self.head + np.arange(n)) % self.max_capacity
+		self.iState[idx, :] = si
+		self.action[idx, :] = a
+		self.reward[idx] = r
+		self.fState[idx, :] = sf
+		self.terminal[idx] = t
+		if self.relabel is not None:
+			self._storeEpisode(idx, achieved)
+		self.size = min(self.size + n, self.capacity)
+		self.head = (self.head + n) % self.max_capacity
+
 	def sample(self, n):
 		if n > self.size:
 			return [], [], [], [], []
-		idx = np.array(random.sample(range(self.size), n))
+		if self.recency is None:
+			idx = np.array(random.sample(range(self.size), n))
+		else:
+			idx = self._recentAges(n)
 		idx = (self.head - idx - 1 + self.max_capacity) % self.max_capacity
-		return self.iState[idx, :], self.action[idx, :], self.reward[idx], self.fState[idx, :], self.terminal[idx]
+		si, a, r, sf, t = self.iState[idx, :], self.action[idx, :], self.reward[idx], self.fState[idx, :], self.terminal[idx]
+		if self.relabel is not None:
+			self._relabel(idx, si, r, sf)
+		return si, a, r, sf, t
+
+	def _recentAges(self, n):
+		# Share of the exponential distribution below the oldest stored age
+		mass = -np.expm1(-self.size / self.recency)
+		ages = -self.recency * np.log1p(-np.random.random_sample(n) * mass)
+		return np.minimum(ages.astype(np.int64), self.size - 1)
+
+	def _relabel(self, idx, si, r, sf):
+		position = self.position[idx]
+		chosen = (np.random.random_sample(len(idx)) < self.ratio) & (position >= 0)
+		if not chosen.any():
+			return
+		idx = idx[chosen]
+		position = position[chosen]
+		# Rows of several robots are interleaved, one episode every stride rows
+		end = np.where(self.episodeEnd[idx] < 0, self.stored - 1, self.episodeEnd[idx])
+		later = np.floor(np.random.random_sample(len(idx)) * ((end - position) // self.stride + 1)).astype(np.int64)
+		goals = self.achievedF[(idx + later * self.stride) % self.max_capacity]
+		si[chosen], sf[chosen], r[chosen] = self.relabel(si[chosen], sf[chosen], r[chosen], self.achievedI[idx], self.achievedF[idx], goals)
+
+	def _resetEpisodes(self):
+		# Transitions stored so far are left out of relabeling, and the stored
+		# count restarts at the head so that it matches the slots written next
+		self.position[:] = -1
+		self.episodeEnd[:] = -1
+		self.stored = self.head
+		self.episodeStart = self.head
+		self.stride = 1
+
+	def _storeEpisode(self, idx, achieved):
+		n = len(idx)
+		if achieved is None:
+			# Transitions without goals, such as recordings, are never relabeled
+			self.position[idx] = -1
+		else:
+			self.achievedI[idx] = np.reshape(achieved[0], (n, -1))
+			self.achievedF[idx] = np.reshape(achieved[1], (n, -1))
+			self.position[idx] = self.stored + np.arange(n)
+			self.stride = n
+		self.episodeEnd[idx] = -1
+		self.stored += n
@@ -0,0 +1,315 @@
+"""
+Learning curves of many runs, read straight from their event files.
+
+Event files are TFRecord files of serialized `Event` protocol buffers. They
+are scanned here with a minimal decoder of the protocol buffer wire format,
+without TensorFlow, and only the scalar summaries are decoded. Every run
+directory keeps an index (`report-index.json`) with, for every event file,
+how many bytes have been scanned and the offsets of the records holding each
+scalar tag. Later reports only scan what was appended since, and read the
+records of the requested tags directly.
+
+Runs are grouped, usually by stripping a seed suffix from their name, and
+the series of a group are interpolated on common steps and summarized with
+their mean and a Student-t confidence interval over the runs.
+"""
+
+import csv
+import json
+import multiprocessing
+import os
+import re
+import struct
+
+import numpy as np
+
+from olc.logger import eventFiles
+
+INDEX_NAME = 'report-index.json'
+# Tags reported by default
+REPORT_TAGS = ['Learning curve', 'Evaluation', 'Critic loss', 'metrics/Confidence']
+# Two-sided 95% quantiles of the Student-t distribution by degrees of freedom
+T_QUANTILES = {
+	1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228,
+	12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980
+}
+
+
+def aggregate(series, points):
+	"""
+	Summarize the series of several runs on common steps.
+
+	Parameters
+	----------
+	series : list of tuple of numpy.ndarray
+		Steps and values of every run.
+	points : int
+		Maximum number of steps of the summary. Series with fewer distinct
+		steps are summarized at their own steps.
+
+	Returns
+	-------
+	table : dict of numpy.ndarray
+		`step`, `mean`, `low` and `high` bounds of the 95% confidence interval,
+		and number of runs `n`, over the steps covered by every run.
+	"""
+	series = [(s, v) for s, v in series if len(s) > 0]
+	if not series:
+		return {'step': np.zeros(0), 'mean': np.zeros(0), 'low': np.zeros(0), 'high': np.zeros(0), 'n': 0}
+	first = max(s[0] for s, _ in series)
+	last = min(s[-1] for s, _ in series)
+	steps = np.unique(np.concatenate([s for s, _ in series]))
+	steps = steps[(steps >= first) & (steps <= last)]
+	if len(steps) > points:
+		steps = np.linspace(first, last, points)
+	values = np.array([np.interp(steps, s, v) for s, v in series])
+	n = len(series)
+	mean = values.mean(axis=0)
+	if n > 1:
+		halfWidth = _tQuantile(n - 1) * values.std(axis=0, ddof=1) / np.sqrt(n)
+	else:
+		halfWidth = np.zeros_like(mean)
+	return {'step': steps, 'mean': mean, 'low': mean - halfWidth, 'high': mean + halfWidth, 'n': n}
+
+
+def group(runs, pattern=None):
+	"""
+	Group runs that only differ by their seed.
+
+	Parameters
+	----------
+	runs : list of str
+		Run directories.
+	pattern : str, optional
+		Regular expression matched against the run path; its first group names
+		the group. By default, a trailing `-<number>` is removed from the path.
+
+	Returns
+	-------
+	groups : dict
+		Run directories by group name.
+	"""
+	groups = {}
+	for run in runs:
+		name = os.path.normpath(run)
+		if pattern is not None:
+			match = re.search(pattern, name)
+			name = match.group(1) if match else name
+		else:
+			name = re.sub(r'[-_]\d+$', '', name)
+		groups.setdefault(name, []).append(run)
+	return groups
+
+
+def readRun(directory, tags):
+	"""
+	Read scalar series of a run, updating its index.
+
+	Parameters
+	----------
+	directory : str
+		Run directory with the event files.
+	tags : list of str
+		Tags to read.
+
+	Returns
+	-------
+	series : dict
+		Steps and values, sorted by step, of every tag found.
+	"""
+	indexPath = os.path.join(directory, INDEX_NAME)
+	try:
+		with open(indexPath, 'r') as indexFile:
+			index = json.load(indexFile)
+	except (OSError, ValueError):
+		index = {}
+	files = eventFiles(directory)
+	names = [os.path.basename(f) for f in files]
+	# Files removed by log retention leave the index
+	index = {name: entry for name, entry in index.items() if name in names}
+	changed = False
+	points = {tag: [] for tag in tags}
+	for path, name in zip(files, names):
+		entry = index.get(name)
+		size = os.path.getsize(path)
+		if entry is None or entry['scanned'] > size:
+			entry = {'scanned': 0, 'offsets': {}}
+			index[name] = entry
+		with open(path, 'rb') as eventFile:
+			if entry['scanned'] < size:
+				entry['scanned'] = _scan(eventFile, entry['scanned'], entry['offsets'])
+				changed = True
+			for tag in tags:
+				for offset in entry['offsets'].get(tag, []):
+					eventFile.seek(offset)
+					step, values = _decodeEvent(_readRecord(eventFile))
+					points[tag].append((step, values[tag]))
+	if changed:
+		with open(indexPath + '.tmp', 'w') as indexFile:
+			json.dump(index, indexFile)
+		os.replace(indexPath + '.tmp', indexPath)
+	series = {}
+	for tag, pairs in points.items():
+		if pairs:
+			pairs.sort()
+			steps, values = zip(*pairs)
+			series[tag] = (np.array(steps, float), np.array(values))
+	return series
+
+
+def report(directories, tags=None, pattern=None, points=100, output=None, jobs=None):
+	"""
+	Aggregate the learning curves of many runs.
+
+	Parameters
+	----------
+	directories : list of str
+		Directories to search for runs. Every directory below them with event
+		files is a run.
+	tags : list of str, optional
+		Tags to report, `REPORT_TAGS` by default.
+	pattern : str, optional
+		Grouping pattern, see `group`.
+	points : int, optional
+		Maximum number of steps of every summary.
+	output : str, optional
+		Directory in which to write one CSV file per tag.
+	jobs : int, optional
+		Number of processes reading runs. By default, one per CPU.
+
+	Returns
+	-------
+	tables : dict
+		Summary of every tag and group, as returned by `aggregate`.
+	"""
+	tags = tags or REPORT_TAGS
+	runs = sorted({os.path.dirname(f) for d in directories for f in _findEvents(d)})
+	with multiprocessing.Pool(jobs) as pool:
+		results = pool.starmap(readRun, [(run, tags) for run in runs])
+	data = dict(zip(runs, results))
+	tables = {}
+	for tag in tags:
+		tables[tag] = {}
+		for name, members in sorted(group(runs, pattern).items()):
+			series = [data[run][tag] for run in members if tag in data[run]]
+			if series:
+				tables[tag][name] = aggregate(series, points)
+	if output is not None:
+		os.makedirs(output, exist_ok=True)
+		for tag, groups in tables.items():
+			path = os.path.join(output, re.sub(r'[^\w.-]+', '_', tag) + '.csv')
+			with open(path, 'w', newline='') as csvFile:
+				writer = csv.writer(csvFile)
+				writer.writerow(['group', 'runs', 'step', 'mean', 'low', 'high'])
+				for name, table in groups.items():
+					for row in zip(table['step'], table['mean'], table['low'], table['high']):
+						writer.writerow([name, table['n'], int(row[0])] + list(row[1:]))
+	return tables
+
+
+def _decodeEvent(data):
+	# Step and scalar values of a serialized Event
+	step = 0
+	values = {}
+	pos = 0
+	while pos < len(data):
+		field, wire, pos = _key(data, pos)
+		if field == 2 and wire == 0:
+			step, pos = _varint(data, pos)
+		elif field == 5 and wire == 2:
+			length, pos = _varint(data, pos)
+			_decodeSummary(data, pos, pos + length, values)
+			pos += length
+		else:
+			pos = _skip(data, pos, wire)
+	return step, values
+
+
+def _decodeSummary(data, pos, end, values):
+	while pos < end:
+		field, wire, pos = _key(data, pos)
+		if field != 1 or wire != 2:
+			pos = _skip(data, pos, wire)
+			continue
+		length, pos = _varint(data, pos)
+		valueEnd = pos + length
+		tag = None
+		scalar = None
+		while pos < valueEnd:
+			field, wire, pos = _key(data, pos)
+			if field == 1 and wire == 2:
+				length, pos = _varint(data, pos)
+				tag = data[pos:pos + length].decode('utf-8')
+				pos += length
+			elif field == 2 and wire == 5:
+				scalar = struct.unpack_from('<f', data, pos)[0]
+				pos += 4
+			else:
+				pos = _skip(data, pos, wire)
+		if tag is not None and scalar is not None:
+			values[tag] = scalar
+
+
+def _findEvents(directory):
+	for root, _, _ in os.walk(directory):
+		yield from eventFiles(root)
+
+
+def _key(data, pos):
+	key, pos = _varint(data, pos)
+	return key >> 3, key & 7, pos
+
+
+def _readRecord(eventFile):
+	# Length, masked CRC of the length, data and masked CRC of the data
+	header = eventFile.read(12)
+	if len(header) < 12:
+		return None
+	length = struct.unpack('<Q', header[:8])[0]
+	data = eventFile.read(length)
+	if len(data) < length or len(eventFile.read(4)) < 4:
+		return None
+	return data
+
+
+def _scan(eventFile, offset, offsets):
+	# Index the complete records after offset and return where scanning ended
+	eventFile.seek(offset)
+	while True:
+		data = _readRecord(eventFile)
+		if data is None:
+			return offset
+		_, values = _decodeEvent(data)
+		for tag in values:
+			offsets.setdefault(tag, []).append(offset)
+		offset = eventFile.tell()
+
+
+def _skip(data, pos, wire):
+	if wire == 0:
+		return _varint(data, pos)[1]
+	if wire == 1:
+		return pos + 8
+	if wire == 2:
+		length, pos = _varint(data, pos)
+		return pos + length
+	if wire == 5:
+		return pos + 4
+	raise ValueError('Unsupported wire type {}'.format(wire))
+
+
+def _tQuantile(dof):
+	known = [d for d in sorted(T_QUANTILES) if d <= dof]
+	return T_QUANTILES[known[-1]] if dof <= 120 else 1.960
+
+
+def _varint(data, pos):
+	result = 0
+	shift = 0
+	while True:
+		byte = data[pos]
+		pos += 1
+		result |= (byte & 0x7f) << shift
+		if byte < 0x80:
+			return result, pos
+		shift += 7
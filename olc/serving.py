@@ -0,0 +1,128 @@
+"""
+Serving of trained policies.
+
+Only the actor network is built and restored from the checkpoint. Actions are
+served over a local stream socket: the client sends the state as raw float32
+values and receives the action in the same format. Every request is answered
+before the next one is read, so the server adds no queueing of its own.
+"""
+
+import os
+import socket
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from olc.neural_network import Actor
+
+
+class PolicyServer:
+
+	def __init__(self, settings, stateDim, boundHigh, boundLow, checkpoint):
+		self.stateDim = stateDim
+		self.actionDim = boundHigh.size
+		self.graph = tf.Graph()
+		with self.graph.as_default():
+			self.state = tf.placeholder(tf.float32, (None, stateDim), name='state')
+			self.actor = Actor('actor', settings['actor'], self.state, False, boundHigh, boundLow)
+			saver = tf.train.Saver(tf.global_variables(scope='actor'))
+			self.session = tf.Session(graph=self.graph)
+			if os.path.isdir(checkpoint):
+				checkpoint = tf.train.latest_checkpoint(checkpoint)
+			saver.restore(self.session, checkpoint)
+			self.policy = self.session.make_callable(self.actor.output, [self.state])
+			self.graph.finalize()
+		self.latencies = LatencyRecorder(settings['serve']['window'])
+
+	def act(self, state):
+		start = time.perf_counter()
+		action = self.policy(state)
+		self.latencies.record(time.perf_counter() - start)
+		return action
+
+	def serve(self, address, reportInterval):
+		if isinstance(address, str):
+			if os.path.exists(address):
+				os.remove(address)
+			listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		else:
+			listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		listener.bind(address)
+		listener.listen(1)
+		# Warm up so the first request does not pay for graph optimization
+		self.policy(np.zeros((1, self.stateDim), np.float32))
+		try:
+			while True:
+				connection, _ = listener.accept()
+				self._serveConnection(connection, reportInterval)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			listener.close()
+			print(self.latencies.report())
+
+	def _serveConnection(self, connection, reportInterval):
+		if connection.family == socket.AF_INET:
+			connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		state = np.zeros((1, self.stateDim), np.float32)
+		request = memoryview(state).cast('B')
+		requests = 0
+		with connection:
+			while _receive(connection, request):
+				action = self.act(state)
+				connection.sendall(action.astype(np.float32, copy=False).tobytes())
+				requests += 1
+				if requests % reportInterval == 0:
+					print(self.latencies.report())
+
+
+class PolicyClient:
+
+	def __init__(self, address, actionDim):
+		if isinstance(address, str):
+			self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		else:
+			self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self.socket.connect(address)
+		self.action = np.zeros(actionDim, np.float32)
+		self.response = memoryview(self.action).cast('B')
+
+	def close(self):
+		self.socket.close()
+
+	def act(self, state):
+		self.socket.sendall(np.asarray(state, np.float32).tobytes())
+		if not _receive(self.socket, self.response):
+			raise ConnectionError('Policy server closed the connection.')
+		return self.action.copy()
+
+
+class LatencyRecorder:
+
+	def __init__(self, window):
+		self.samples = np.zeros(window)
+		self.count = 0
+
+	def record(self, latency):
+		self.samples[self.count % self.samples.size] = latency
+		self.count += 1
+
+	def report(self):
+		if self.count == 0:
+			return 'No requests served.'
+		samples = self.samples[:min(self.count, self.samples.size)] * 1e3
+		p50, p99 = np.percentile(samples, [50, 99])
+		return 'Requests: {}\tp50: {:.3f}ms\tp99: {:.3f}ms\tmax: {:.3f}ms'.format(self.count, p50, p99, samples.max())
+
+
+def _receive(connection, buffer):
+	received = 0
+	while received < len(buffer):
+		n = connection.recv_into(buffer[received:])
+		if n == 0:
+			return False
+		received += n
+	return True
@@ -61,3 +61,43 @@ def merge(a, b):
 		if isinstance(value, dict) and key in b and isinstance(b[key], dict):
 			merged[key] = merge(value, b[key])
 	return merged
+
+
+def getValue(settings, path):
+	"""
+	Get a value from a nested settings object.
+
+	Parameters
+	----------
+	settings : dict
+		Settings object to read.
+	path : str
+		Keys to follow, separated by slashes (for example `actor/learning-rate`).
+
+	Returns
+	-------
+	value
+		Value stored at the given path.
+	"""
+	for key in path.split('/'):
+		settings = settings[key]
+	return settings
+
+
+def setValue(settings, path, value):
+	"""
+	Set a value in a nested settings object.
+
+	Parameters
+	----------
+	settings : dict
+		Settings object to modify in place.
+	path : str
+		Keys to follow, separated by slashes (for example `actor/learning-rate`).
+	value
+		Value to store at the given path.
+	"""
+	keys = path.split('/')
+	for key in keys[:-1]:
+		settings = settings[key]
+	settings[keys[-1]] = value
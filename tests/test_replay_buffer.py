@@ -0,0 +1,63 @@
+"""
+Goal relabeling of the replay buffer when its head does not start at zero.
+"""
+
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+
+from olc.replay_buffer import ReplayBuffer
+
+
+def _buffer(capacity):
+	# Placeholders for the graph variables, which these tests never touch
+	names = ['cap', 'h', 'sz', 'si', 'a', 'r', 'sf', 't']
+	buffer = ReplayBuffer(capacity, 1, 1, variables=types.SimpleNamespace(**dict.fromkeys(names)))
+	# The reward of a relabeled transition is its new goal
+	buffer.setRelabeling(lambda si, sf, r, achievedI, achievedF, goals: (si, sf, goals[:, 0]), 1, 1.)
+	return buffer
+
+
+def _storeEpisode(buffer, achieved):
+	for value in achieved:
+		buffer.storeTransition([value], [0], -1, [value], False, ([value], [value]))
+	buffer.endEpisode()
+
+
+def _checkGoals(buffer, achieved):
+	si, _, r, _, _ = buffer.sample(buffer.size)
+	episode = np.isin(si[:, 0], achieved)
+	assert episode.sum() == len(achieved)
+	# Every goal is achieved later in the same episode
+	assert np.all(np.isin(r[episode], achieved))
+	assert np.all(r[episode] >= si[episode, 0])
+
+
+def testRelabelAfterRestore():
+	buffer = _buffer(8)
+	buffer.head = buffer.size = 5
+	buffer.setRelabeling(buffer.relabel, 1, 1.)
+	_storeEpisode(buffer, [11., 12., 13., 14.])
+	_checkGoals(buffer, [11., 12., 13., 14.])
+
+
+def testRelabelAfterLargeWarmStart():
+	buffer = _buffer(8)
+	n = 11
+	buffer.storeTransitions(np.zeros((n, 1)), np.zeros((n, 1)), np.zeros(n), np.zeros((n, 1)), np.zeros(n, bool))
+	_storeEpisode(buffer, [11., 12., 13., 14.])
+	_checkGoals(buffer, [11., 12., 13., 14.])
+
+
+def testRestoreDropsEpisodes():
+	buffer = _buffer(8)
+	_storeEpisode(buffer, [11., 12., 13.])
+	# A restore replaces the transitions, as when a population member exploits another
+	session = types.SimpleNamespace(run=lambda variables: [8, 6, 6] + [np.zeros(x.shape) for x in [buffer.iState, buffer.action, buffer.reward, buffer.fState, buffer.terminal]])
+	buffer.restore(session)
+	assert np.all(buffer.position == -1)
+	_storeEpisode(buffer, [21., 22.])
+	_checkGoals(buffer, [21., 22.])